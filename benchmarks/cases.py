@@ -0,0 +1,170 @@
+"""
+The benchmarked cases, each one a generator of outputs and the struct to
+parse them with
+"""
+
+import collections
+
+from . import generators
+
+# ``items`` is the dotted path of the list holding an item per block
+Case = collections.namedtuple(
+    "Case", ["name", "description", "generate", "struct", "items"]
+)
+
+FLOW_STRUCT = {
+    "tables": [
+        {
+            "#id": r"\[TABLE (\d{1,2})\]",
+            "flows": [
+                {
+                    "#id": r"\[FLOW_ID(\d+)\]",
+                    "timestamp": r"Timestamp\s+=\s+(.+)",
+                    "ofp_version": r"ofp_version\s+=\s+(\d+)",
+                    "controller_group": r"ControllerGroup\s+=\s+(\d+)",
+                    "controller_id": r"ControllerId\s+=\s+(\d+)",
+                    "priority": r"Priority\s+=\s+(\d+)",
+                    "idle_timeout": r"Idle_timeout\s+=\s+(\d+)",
+                    "hard_timeout": r"Hard_timeout\s+=\s+(\d+)",
+                    "packet_count": r"Packet_count\s+=\s+(\d+)",
+                    "byte_count": r"Byte_count\s+=\s+(\d+)",
+                    "cookie": r"Cookie\s+=\s+([0-9a-fA-F]+)",
+                    "send_flow_rem": r"Send_flow_rem\s+=\s+(true|false)",
+                    "match_fields": {
+                        "#start": r"(\[MATCHFIELDS\])",
+                        "#end": r"(\[INSTRUCTIONS\])",
+                        "ether_type": r"OFPXMT_OFB_ETH_TYPE\s+=\s+(.+)",
+                        "in_port": r"OFPXMT_OFB_IN_PORT\s+=\s+(.+)",
+                        "mpls_label": r"OFPXMT_OFB_MPLS_LABEL\s+=\s+(.+)",
+                    },
+                    "instructions": {
+                        "#start": r"(\[INSTRUCTIONS\])",
+                        "go_to_table": {
+                            "#start": r"(\[OFPIT_GOTO_TABLE\])",
+                            "table": r"table\s+=\s+(\d+)",
+                        },
+                        "apply_actions": {
+                            "#start": r"(\[OFPIT_APPLY_ACTIONS\])",
+                            "output": {
+                                "port": r"port\s+=\s+(.+)",
+                                "mlen": r"mlen\s+=\s+(.+)",
+                            },
+                            "pop_mpls": {
+                                "#start": r"(\[OFPAT_POP_MPLS\])",
+                                "eth": r"eth\s+=\s+(.+)",
+                            },
+                            "group": {
+                                "#start": r"(\[OFPAT_GROUP\])",
+                                "#id": r"id\s+=\s+(\d+)",
+                            },
+                        },
+                    },
+                }
+            ],
+        }
+    ]
+}
+
+GROUP_STRUCT = {
+    "groups": [
+        {
+            "#id": r"Group id:\s+(\d+)",
+            "ref_count": r"Reference count:\s+(\d+)",
+            "packet_count": r"Packet count:\s+(\d+)",
+            "byte_count": r"Byte count:\s+(\d+)",
+            "bucket": [
+                {
+                    "#id": r"Bucket\s+(\d+)",
+                    "packet_count": r"Packet count:\s+(\d+)",
+                    "byte_count": r"Byte count:\s+(\d+)",
+                }
+            ],
+        }
+    ]
+}
+
+IFCONFIG_STRUCT = {
+    "interfaces": [
+        {
+            "#id": r"(eth\d+)",
+            "ipv4_address": r"inet addr:(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})",
+            "mac_address": r"HWaddr\s((?:[a-fA-F0-9]{2}[:|\-]?){6})",
+            "rx_packets": r"RX packets:(\d+)",
+            "tx_packets": r"TX packets:(\d+)",
+        }
+    ]
+}
+
+# a single '#start'/'#end' chunk is found in a text, they are looked for in
+# the chunk of every flow
+START_END_STRUCT = {
+    "flows": [
+        {
+            "#id": r"\[FLOW_ID(\d+)\]",
+            "match_fields": [
+                {
+                    "#start": r"(\[MATCHFIELDS\])",
+                    "#end": r"(\[INSTRUCTIONS\])",
+                    "ether_type": r"OFPXMT_OFB_ETH_TYPE\s+=\s+(.+)",
+                    "in_port": r"OFPXMT_OFB_IN_PORT\s+=\s+(.+)",
+                }
+            ],
+        }
+    ]
+}
+
+LIST_REGEX_STRUCT = {
+    "packet_counts": [r"Packet count:\s+(\d+)"],
+    "byte_counts": [r"Byte count:\s+(\d+)"],
+}
+
+CASES = collections.OrderedDict(
+    (case.name, case)
+    for case in [
+        Case(
+            "flat",
+            "list of flat dicts, ifconfig interfaces",
+            generators.ifconfig,
+            IFCONFIG_STRUCT,
+            "interfaces",
+        ),
+        Case(
+            "flows",
+            "list of nested dicts, OpenFlow flow dump",
+            generators.flow_dump,
+            FLOW_STRUCT,
+            "tables.flows",
+        ),
+        Case(
+            "groups",
+            "list of dicts holding a list, group dump",
+            generators.group_dump,
+            GROUP_STRUCT,
+            "groups",
+        ),
+        Case(
+            "start_end",
+            "'#start'/'#end' chunks, match fields of a flow dump",
+            generators.flow_dump,
+            START_END_STRUCT,
+            "flows.match_fields",
+        ),
+        Case(
+            "list_regex",
+            "regexes given as lists, group dump",
+            generators.group_dump,
+            LIST_REGEX_STRUCT,
+            "packet_counts",
+        ),
+    ]
+    + [
+        Case(
+            "depth{}".format(depth),
+            "sections nested {} levels deep".format(depth),
+            lambda blocks, depth=depth: generators.nested_dump(blocks, depth),
+            generators.nested_struct(depth),
+            ".".join(["sections"] + ["children"] * (depth - 1)),
+        )
+        for depth in (2, 4)
+    ]
+)
@@ -0,0 +1,169 @@
+"""
+Generators of synthetic device outputs, shaped like the fixtures under
+``tests`` but of any size
+"""
+
+import random
+
+_ACTIONS = (
+    "                    [OFPAT_OUTPUT]\n"
+    "                        port = {port}\n"
+    "                        mlen = 65535\n",
+    "                    [OFPAT_GROUP]\n" "                        id = {group}\n",
+    "                    [OFPAT_POP_MPLS]\n"
+    "                        eth = 0x8847\n"
+    "                    [OFPAT_OUTPUT]\n"
+    "                        port = {port}\n",
+)
+
+
+def flow_dump(blocks, tables=None, seed=0):
+    """An OpenFlow flow dump of ``blocks`` flows spread over ``tables`` tables"""
+    rnd = random.Random(seed)
+    tables = tables or max(1, blocks // 1000)
+    out = ["[FLOW_ENTRIES] Total entries: {}\n".format(blocks)]
+    per_table = -(-blocks // tables)
+    for table in range(tables):
+        count = min(per_table, blocks - table * per_table)
+        if count <= 0:
+            break
+        out.append("[TABLE {}] Total entries: {}\n".format(table, count))
+        for flow in range(1, count + 1):
+            out.append(_flow(rnd, flow))
+        out.append("\n")
+    return "".join(out)
+
+
+def _flow(rnd, flow):
+    lines = [
+        "    [FLOW_ID{}]\n".format(flow),
+        "        Timestamp        = Wed Mar 22 00:58:03 2017\n",
+        "        ofp_version      = 4\n",
+        "        ControllerGroup  = 1\n",
+        "        ControllerId     = 1\n",
+        "        Priority         = {}\n".format(rnd.randint(0, 65535)),
+        "        Idle_timeout     = 0\n",
+        "        Hard_timeout     = 0\n",
+        "        Packet_count     = {}\n".format(rnd.randint(0, 10**9)),
+        "        Byte_count       = {}\n".format(rnd.randint(0, 10**12)),
+        "        Cookie           = {:016x}\n".format(rnd.getrandbits(64)),
+        "        Send_flow_rem    = false\n",
+        "        [MATCHFIELDS]\n",
+        "            OFPXMT_OFB_ETH_TYPE = 0x8847\n",
+    ]
+    if rnd.random() < 0.5:
+        lines.append("            OFPXMT_OFB_IN_PORT = {}\n".format(rnd.randint(1, 48)))
+        lines.append(
+            "            OFPXMT_OFB_MPLS_LABEL = {}\n".format(rnd.randint(16, 10**6))
+        )
+    lines.append("        [INSTRUCTIONS]\n")
+    if rnd.random() < 0.3:
+        lines.append("            [OFPIT_GOTO_TABLE]\n")
+        lines.append("                table = {}\n".format(rnd.randint(1, 10)))
+    else:
+        lines.append("            [OFPIT_APPLY_ACTIONS]\n")
+        lines.append("                 [ACTIONS]\n")
+        lines.append(
+            rnd.choice(_ACTIONS).format(
+                port=rnd.randint(1, 48), group=rnd.randint(2 * 10**9, 3 * 10**9)
+            )
+        )
+    return "".join(lines)
+
+
+def group_dump(blocks, buckets=3, seed=0):
+    """A group table dump of ``blocks`` groups of ``buckets`` buckets each"""
+    rnd = random.Random(seed)
+    out = []
+    for group in range(blocks):
+        out.append(
+            "    +----------------------+\n"
+            "    | Group id: {} |\n"
+            "    +----------------------+\n"
+            "    Reference count:  {}\n"
+            "    Packet count:     {}\n"
+            "    Byte count:       {}\n"
+            "    Duration (sec):   248541\n"
+            "    Duration (nsec):  568884914\n".format(
+                2000000000 + group,
+                rnd.randint(0, 8),
+                rnd.randint(0, 10**9),
+                rnd.randint(0, 10**12),
+            )
+        )
+        for bucket in range(buckets):
+            out.append(
+                "    Bucket  {}:\n"
+                "        Packet count:  {}\n"
+                "        Byte count:    {}\n".format(
+                    bucket, rnd.randint(0, 10**9), rnd.randint(0, 10**12)
+                )
+            )
+        out.append("\n")
+    return "".join(out)
+
+
+def ifconfig(blocks, seed=0):
+    """An ifconfig output of ``blocks`` interfaces"""
+    rnd = random.Random(seed)
+    out = []
+    for interface in range(blocks):
+        mac = ":".join("{:02x}".format(rnd.getrandbits(8)) for _ in range(6))
+        out.append(
+            "eth{}      Link encap:Ethernet  HWaddr {}\n"
+            "          inet addr:10.{}.{}.{}  Bcast:10.255.255.255  Mask:255.0.0.0\n"
+            "          UP BROADCAST RUNNING MULTICAST  MTU:1500  Metric:1\n"
+            "          RX packets:{} errors:0 dropped:0 overruns:0 frame:0\n"
+            "          TX packets:{} errors:0 dropped:0 overruns:0 carrier:0\n"
+            "          collisions:0 txqueuelen:1000\n"
+            "          RX bytes:{}  TX bytes:{}\n\n".format(
+                interface,
+                mac,
+                interface // 65536 % 256,
+                interface // 256 % 256,
+                interface % 256,
+                rnd.randint(0, 10**9),
+                rnd.randint(0, 10**9),
+                rnd.randint(0, 10**12),
+                rnd.randint(0, 10**12),
+            )
+        )
+    return "".join(out)
+
+
+def nested_dump(blocks, depth, fanout=4, seed=0):
+    """
+    Sections nested ``depth`` levels deep, ``blocks`` being the number of
+    sections of the innermost level
+    """
+    rnd = random.Random(seed)
+    out = []
+    outer = max(1, blocks // fanout ** (depth - 1))
+
+    def section(level, index):
+        indent = "  " * level
+        out.append("{}[L{} {}]\n".format(indent, level, index))
+        out.append("{}  value = {}\n".format(indent, rnd.randint(0, 10**6)))
+        out.append("{}  name = item-{}-{}\n".format(indent, level, index))
+        if level + 1 < depth:
+            for child in range(fanout):
+                section(level + 1, child)
+
+    for index in range(outer):
+        section(0, index)
+    return "".join(out)
+
+
+def nested_struct(depth):
+    """The struct of a ``nested_dump`` of the same depth"""
+    struct = None
+    for level in reversed(range(depth)):
+        node = {
+            "#id": r"\[L{} (\d+)\]".format(level),
+            "value": r"value = (\d+)",
+            "name": r"name = (\S+)",
+        }
+        if struct is not None:
+            node["children"] = [struct]
+        struct = node
+    return {"sections": [struct]}
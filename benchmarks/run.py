@@ -0,0 +1,133 @@
+"""
+Runs the benchmarks and reports the throughput and peak memory of parsing
+the generated outputs.
+
+    python -m benchmarks.run --sizes 1000,10000 --cases flows,groups
+"""
+
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from pytijo import parser
+from .cases import CASES
+
+DEFAULT_SIZES = (1000, 10000)
+
+
+def measure(case, blocks, repeat=3, memory=True):
+    text = case.generate(blocks)
+    plan = parser.compile(case.struct)
+    # the first parse is left out, it warms up the caches. The throughput is
+    # the one of the items it gives, not of the blocks asked for
+    items = count_items(plan.parse(text), case.items)
+
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        plan.parse(text)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        plan.parse(text)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    size = len(text.encode("utf-8"))
+    return {
+        "case": case.name,
+        "blocks": blocks,
+        "items": items,
+        "bytes": size,
+        "seconds": best,
+        "mb_per_second": size / best / 1e6,
+        "items_per_second": items / best,
+        "peak_memory_mb": peak / 1e6 if peak is not None else None,
+    }
+
+
+def count_items(result, path):
+    """Returns the number of items of the list at the dotted ``path`` of a result"""
+    values = [result]
+    for key in path.split("."):
+        found = []
+        for value in values:
+            value = value.get(key) if isinstance(value, dict) else None
+            if isinstance(value, list):
+                found.extend(value)
+            elif value is not None:
+                found.append(value)
+        values = found
+    return len(values)
+
+
+def main(argv=None):
+    args = _arguments().parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    names = args.cases.split(",") if args.cases else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        sys.exit("unknown cases: {}".format(", ".join(unknown)))
+
+    results = []
+    if not args.json:
+        print(
+            "{:<12} {:>8} {:>8} {:>9} {:>9} {:>9} {:>11} {:>9}".format(
+                "case", "blocks", "items", "MB", "seconds", "MB/s", "items/s", "peak MB"
+            )
+        )
+    for name in names:
+        for blocks in sizes:
+            result = measure(
+                CASES[name], blocks, repeat=args.repeat, memory=not args.no_memory
+            )
+            results.append(result)
+            if not args.json:
+                print(_format(result))
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+def _format(result):
+    peak = result["peak_memory_mb"]
+    return "{:<12} {:>8} {:>8} {:>9.2f} {:>9.3f} {:>9.2f} {:>11.0f} {:>9}".format(
+        result["case"],
+        result["blocks"],
+        result["items"],
+        result["bytes"] / 1e6,
+        result["seconds"],
+        result["mb_per_second"],
+        result["items_per_second"],
+        "-" if peak is None else "{:.1f}".format(peak),
+    )
+
+
+def _arguments():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="comma separated numbers of blocks, e.g. 1000,10000,100000",
+    )
+    arguments.add_argument(
+        "--cases", help="comma separated cases: {}".format(", ".join(CASES))
+    )
+    arguments.add_argument("--repeat", type=int, default=3)
+    arguments.add_argument(
+        "--no-memory", action="store_true", help="skip the peak memory measure"
+    )
+    arguments.add_argument("--json", action="store_true", help="report as JSON")
+    return arguments
+
+
+if __name__ == "__main__":
+    main()
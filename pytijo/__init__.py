@@ -1 +1 @@
-__all__ = ["parser"]
+__all__ = ["parser", "cache", "instrument", "backends", "registry"]
@@ -0,0 +1,43 @@
+# asyncio front-end of the parser, it requires python 3.6 or later
+import asyncio
+import functools
+
+from . import plan as _plan
+from .constants import DEFAULT_ENCODING
+from .stream import LineParser
+
+
+async def parse_async(text, struct, executor=None, encoding=DEFAULT_ENCODING):
+    """
+    Parses the text like ``parse`` in ``executor``, the default executor of
+    the event loop if none is given, so the loop is not blocked by big texts.
+    The regexes hold the GIL while they match, only a process pool keeps the
+    loop running during the parse.
+    """
+    loop = asyncio.get_event_loop()
+    # a bad struct fails here rather than in the executor
+    _plan.compile(struct)
+    return await loop.run_in_executor(
+        executor, functools.partial(_parse, struct, text, encoding)
+    )
+
+
+def _parse(struct, text, encoding):
+    # the plans hold modules, which cannot be sent to a worker process, the
+    # struct is sent instead and compiled through the plan cache of the worker
+    return _plan.compile(struct).parse(text, encoding)
+
+
+async def parse_stream_async(lines, struct, key=None, encoding=DEFAULT_ENCODING):
+    """
+    Parses the lines of an async iterable, e.g. the output read from a SSH
+    session, yielding the items of the list at ``key`` as soon as their
+    chunk is read. The chunks are found with the same rules as
+    ``parse_stream``.
+    """
+    parser = LineParser(_plan.compile(struct), key, encoding)
+    async for line in lines:
+        for item in parser.feed(line):
+            yield item
+    for item in parser.close():
+        yield item
@@ -0,0 +1,180 @@
+import re
+import six
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# assertions that look at the text before the position where the regex is
+# applied, their result depends on where the text starts
+_CONTEXT_AT = frozenset(
+    [
+        sre_parse.AT_BEGINNING,
+        sre_parse.AT_BEGINNING_LINE,
+        sre_parse.AT_BEGINNING_STRING,
+        sre_parse.AT_BOUNDARY,
+        sre_parse.AT_NON_BOUNDARY,
+    ]
+)
+
+
+def parse_pattern(regex):
+    """Returns the parsed tree of a compiled regex, or None if it cannot be parsed"""
+    try:
+        return sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:
+        return None
+
+
+def _flags(parsed):
+    # the global flags of the parsed regex, including the inline ones
+    state = getattr(parsed, "state", None) or parsed.pattern
+    return state.flags
+
+
+def walk(parsed):
+    """Yields every ``(op, av)`` node of a parsed regex, depth first"""
+    for op, av in parsed:
+        yield op, av
+        for child in _children(av):
+            for node in walk(child):
+                yield node
+
+
+def _children(av):
+    if isinstance(av, sre_parse.SubPattern):
+        yield av
+    elif isinstance(av, (list, tuple)):
+        for item in av:
+            for child in _children(item):
+                yield child
+
+
+def needs_context(regex):
+    """
+    Whether matching the regex from a position of a text may give a different
+    result than matching it on the text sliced at that position
+    """
+    parsed = parse_pattern(regex)
+    if parsed is None:
+        return True
+    for op, av in walk(parsed):
+        if op == sre_parse.AT and av in _CONTEXT_AT:
+            return True
+        if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT) and av[0] < 0:
+            return True
+    return False
+
+
+def leading_class(regex):
+    """
+    Whether the regex starts with a character class and, when the class is
+    made of literals only, the characters a match can start with
+    """
+    parsed = parse_pattern(regex)
+    if parsed is None or _flags(parsed) & re.IGNORECASE or len(parsed) <= 0:
+        return False, None
+    op, av = parsed[0]
+    if op != sre_parse.IN:
+        return False, None
+    if all(o == sre_parse.LITERAL for o, _ in av):
+        to_char = six.int2byte if isinstance(regex.pattern, bytes) else six.unichr
+        return True, frozenset(to_char(a) for _, a in av)
+    return True, None
+
+
+def literal_prefix(regex):
+    """
+    Returns the literal every match of the regex starts with, None if there
+    is none. Case insensitive regexes have no literal prefix.
+    """
+    parsed = parse_pattern(regex)
+    if parsed is None or _flags(parsed) & re.IGNORECASE:
+        return None
+    codes = []
+    _collect_prefix(parsed, codes)
+    if len(codes) <= 0:
+        return None
+    if isinstance(regex.pattern, bytes):
+        return b"".join(six.int2byte(c) for c in codes)
+    return "".join(six.unichr(c) for c in codes)
+
+
+def _collect_prefix(parsed, codes):
+    # appends the leading literals of the parsed regex, returns whether the
+    # whole of it is literal so the prefix goes on after it
+    for op, av in parsed:
+        if op == sre_parse.LITERAL:
+            codes.append(av)
+        elif op == sre_parse.SUBPATTERN:
+            # (group, add_flags, del_flags, pattern) or (group, pattern)
+            if len(av) > 2 and (av[1] or av[2]):
+                return False
+            if not _collect_prefix(av[-1], codes):
+                return False
+        else:
+            return False
+    return True
+
+
+def required_literal(regex):
+    """
+    Returns the longest literal that every match of the regex contains, None
+    if there is none. A text without it has no match of the regex.
+    """
+    parsed = parse_pattern(regex)
+    if parsed is None or _flags(parsed) & re.IGNORECASE:
+        return None
+    best = []
+    run = []
+    for code in _required_codes(parsed):
+        if code is None:
+            run = []
+            continue
+        run.append(code)
+        if len(run) > len(best):
+            best = list(run)
+    if len(best) <= 0:
+        return None
+    if isinstance(regex.pattern, bytes):
+        return b"".join(six.int2byte(c) for c in best)
+    return "".join(six.unichr(c) for c in best)
+
+
+def _required_codes(parsed):
+    # the literals a match goes through in order, None wherever something
+    # else may be matched in between
+    for op, av in parsed:
+        if op == sre_parse.LITERAL:
+            yield av
+        elif op == sre_parse.SUBPATTERN and not (len(av) > 2 and (av[1] or av[2])):
+            for code in _required_codes(av[-1]):
+                yield code
+        else:
+            yield None
+
+
+_REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+
+
+def backtracking_risk(regex):
+    """
+    Whether the regex repeats without bound a part which itself repeats
+    without bound, e.g. ``(\\w+\\s?)+``. When such a regex fails to match, the
+    engine may try every way of splitting the text between the repeats,
+    which takes exponential time on long lines. The repeated parts holding
+    a literal, e.g. ``(?:/\\w+)+``, are split by it and deemed safe.
+    """
+    parsed = parse_pattern(regex)
+    if parsed is None:
+        return False
+    for op, av in walk(parsed):
+        if op not in _REPEATS or av[1] != sre_parse.MAXREPEAT:
+            continue
+        if any(code is not None for code in _required_codes(av[2])):
+            continue
+        for inner_op, inner_av in walk(av[2]):
+            if inner_op in _REPEATS and inner_av[1] == sre_parse.MAXREPEAT:
+                return True
+    return False
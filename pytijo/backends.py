@@ -0,0 +1,131 @@
+import re
+import importlib
+import threading
+
+DEFAULT_BACKEND = "re"
+
+# inline spelling of the flags for the engines that only take them that way
+_INLINE_FLAGS = ((re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s"))
+
+
+class Backend(object):
+    """
+    A regex engine with the interface of the ``re`` module: compiled patterns
+    with ``search``, ``match`` and ``finditer`` taking ``pos`` and ``endpos``,
+    and matches with ``group``, ``start`` and ``span``.
+
+    The engine is imported the first time a pattern is compiled, so backends
+    whose package is not installed can be registered anyway.
+    """
+
+    def __init__(self, name, module_name, inline_flags=False, flags=None):
+        self.name = name
+        self.module_name = module_name
+        # flags are given inline, at the start of the pattern
+        self.inline_flags = inline_flags
+        # flags of the ``re`` module the engine supports, None if all of them
+        self.flags = flags
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def module(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self.module_name)
+        return self._module
+
+    def available(self):
+        try:
+            self.module
+        except ImportError:
+            return False
+        return True
+
+    def compile(self, pattern, flags=0):
+        if self.flags is not None and flags & ~self.flags:
+            raise ValueError(
+                "The '{}' regex backend does not support the flags {}".format(
+                    self.name, flags & ~self.flags
+                )
+            )
+        if self.inline_flags:
+            pattern = _with_inline_flags(pattern, flags)
+            return self.module.compile(pattern)
+        return self.module.compile(pattern, flags)
+
+
+_backends = {
+    "re": Backend("re", "re"),
+    "regex": Backend("regex", "regex"),
+    # RE2 matches in linear time, it has no backreferences nor lookarounds
+    "re2": Backend(
+        "re2",
+        "re2",
+        inline_flags=True,
+        flags=re.IGNORECASE | re.MULTILINE | re.DOTALL,
+    ),
+}
+_default = DEFAULT_BACKEND
+
+
+def register(backend):
+    """Makes a ``Backend`` selectable by its name"""
+    _backends[backend.name] = backend
+
+
+def get(name=None):
+    """Returns the backend called ``name``, the default one if no name is given"""
+    if isinstance(name, Backend):
+        return name
+    try:
+        return _backends[_default if name is None else name]
+    except KeyError:
+        raise ValueError("Unknown regex backend '{}'".format(name))
+
+
+def available():
+    """Returns the names of the backends whose engine is installed"""
+    return sorted(name for name, backend in _backends.items() if backend.available())
+
+
+def set_default(name):
+    """
+    Selects the backend used when none is given. It fails if the engine of
+    the backend is not installed.
+    """
+    global _default
+    backend = get(name)
+    backend.module
+    _default = backend.name
+
+
+def default():
+    return _default
+
+
+def compile(pattern, flags=0, backend=None):
+    """
+    Compiles the pattern with the backend, falling back to the ``re`` module
+    when the engine does not support the pattern or the flags
+    """
+    backend = get(backend)
+    if backend.name == DEFAULT_BACKEND:
+        return re.compile(pattern, flags)
+    try:
+        return backend.compile(pattern, flags)
+    except ImportError:
+        raise
+    except Exception:
+        return re.compile(pattern, flags)
+
+
+def _with_inline_flags(pattern, flags):
+    inline = "".join(letter for flag, letter in _INLINE_FLAGS if flags & flag)
+    if not inline:
+        return pattern
+    prefix = "(?{})".format(inline)
+    if isinstance(pattern, bytes):
+        prefix = prefix.encode("ascii")
+    return prefix + pattern
@@ -0,0 +1,389 @@
+import json
+import time
+import hashlib
+import datetime
+import collections
+import importlib
+import threading
+
+import six
+
+from . import backends
+
+try:
+    import sqlite3
+except ImportError:  # python built without sqlite
+    sqlite3 = None
+
+try:
+    import ipaddress
+except ImportError:  # python 2 without the 'ipaddress' backport
+    ipaddress = None
+
+PATTERN_CACHE_SIZE = 4096
+MODULE_CACHE_SIZE = 256
+PLAN_CACHE_SIZE = 128
+RESULT_CACHE_SIZE = 128
+DISK_CACHE_BYTES = 256 * 1024 * 1024
+# seconds waited for the lock of a database shared with other processes
+DISK_CACHE_TIMEOUT = 1.0
+
+_MISSING = object()
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"]
+)
+
+
+class LRUCache(object):
+    """
+    A bounded and thread safe cache evicting the least recently used
+    entries, which counts its hits, misses and evictions
+    """
+
+    def __init__(self, maxsize):
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, factory):
+        """
+        Returns the value cached at ``key``, calling ``factory`` to create it
+        if it is not cached. Unhashable keys are never cached.
+        """
+        try:
+            with self._lock:
+                value = self._data.pop(key)
+                # keep the most recently used entries at the end
+                self._data[key] = value
+                self.hits += 1
+                return value
+        except KeyError:
+            pass
+        except TypeError:
+            return factory()
+
+        value = factory()
+        with self._lock:
+            self.misses += 1
+            self._data[key] = value
+            self._shrink()
+        return value
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            self._shrink()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, self.evictions, self.maxsize, len(self._data)
+            )
+
+    def _shrink(self):
+        while len(self._data) > max(self.maxsize, 0):
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+
+patterns = LRUCache(PATTERN_CACHE_SIZE)
+modules = LRUCache(MODULE_CACHE_SIZE)
+plans = LRUCache(PLAN_CACHE_SIZE)
+
+_caches = {"patterns": patterns, "modules": modules, "plans": plans}
+
+
+def compile_pattern(pattern, flags=0, backend=None):
+    """
+    Compiles the pattern with a regex backend, the default one unless a name
+    is given, through the process wide cache of patterns
+    """
+    backend = backends.get(backend)
+    return patterns.get(
+        (backend.name, type(pattern), pattern, flags),
+        lambda: backends.compile(pattern, flags, backend),
+    )
+
+
+def import_module(name):
+    """``importlib.import_module`` through the process wide cache of modules"""
+    return modules.get(name, lambda: importlib.import_module(name))
+
+
+def info():
+    """Returns the ``CacheInfo`` of the 'patterns', 'modules' and 'plans' caches"""
+    return dict((name, cache.info()) for name, cache in _caches.items())
+
+
+def resize(patterns=None, modules=None, plans=None):
+    """Sets the maximum number of entries of the caches that are given"""
+    for name, maxsize in (
+        ("patterns", patterns),
+        ("modules", modules),
+        ("plans", plans),
+    ):
+        if maxsize is not None:
+            _caches[name].resize(maxsize)
+
+
+def clear():
+    """Empties the caches and resets their counters"""
+    for cache in _caches.values():
+        cache.clear()
+
+
+class ResultCache(object):
+    """
+    The results of parses by text and struct, so parsing the same text with
+    the same struct again is a lookup. The results are kept in a LRU cache
+    of ``maxsize`` entries and, when a ``path`` is given, in a sqlite
+    database at that path holding up to ``max_bytes`` of results stored as
+    JSON, which outlives the process and can be shared between processes.
+    A database locked by another process for longer than ``timeout`` seconds
+    is skipped, the result being parsed rather than read or written.
+
+    The results found in memory are the same objects for every parse, they
+    must not be modified.
+    """
+
+    def __init__(
+        self,
+        maxsize=RESULT_CACHE_SIZE,
+        path=None,
+        max_bytes=DISK_CACHE_BYTES,
+        timeout=DISK_CACHE_TIMEOUT,
+    ):
+        self.memory = LRUCache(maxsize)
+        self.disk = None if path is None else DiskStore(path, max_bytes, timeout)
+
+    def get(self, text, struct, parse, *options):
+        """
+        Returns the cached result of the text and struct, calling ``parse()``
+        to get it when it is not cached. ``options`` are the options of the
+        parse which change its result, e.g. the encoding.
+        """
+        try:
+            key = result_key(text, struct, *options)
+        except TypeError:
+            # like unhashable keys, the texts which cannot be hashed are
+            # never cached
+            return parse()
+        return self.memory.get(key, lambda: self._load(key, parse))
+
+    def _load(self, key, parse):
+        if self.disk is not None:
+            result = self.disk.get(key, _MISSING)
+            if result is not _MISSING:
+                return result
+        result = parse()
+        if self.disk is not None:
+            self.disk.set(key, result)
+        return result
+
+    def info(self):
+        """Returns the ``CacheInfo`` of the 'memory' and 'disk' tiers"""
+        tiers = {"memory": self.memory.info()}
+        if self.disk is not None:
+            tiers["disk"] = self.disk.info()
+        return tiers
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+
+class DiskStore(object):
+    """
+    A sqlite table of values by key, evicting the least recently used ones
+    once their size goes over ``max_bytes``. The values are stored as JSON,
+    so reading a database written by someone else never runs code, the
+    timestamps and IP addresses of the typed values being tagged to be
+    read back as such. The values JSON cannot hold are not stored.
+
+    The database is shared between processes in WAL mode, so readers do not
+    wait for writers. When it stays locked for longer than ``timeout``
+    seconds, the lookups miss and the values are not stored.
+    """
+
+    def __init__(self, path, max_bytes=DISK_CACHE_BYTES, timeout=DISK_CACHE_TIMEOUT):
+        if sqlite3 is None:
+            raise ImportError("The disk cache requires the 'sqlite3' module")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value TEXT, size INTEGER, used REAL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS results_used ON results (used)"
+            )
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT value FROM results WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error:
+                # e.g. the database is locked by another process
+                row = None
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            try:
+                with self._db:
+                    self._db.execute(
+                        "UPDATE results SET used = ? WHERE key = ?", (time.time(), key)
+                    )
+            except sqlite3.Error:
+                # the entry is only evicted sooner
+                pass
+        try:
+            return json.loads(row[0], object_hook=_decode_object)
+        except (TypeError, ValueError):
+            # e.g. a value written by an older version
+            return default
+
+    def set(self, key, value):
+        try:
+            data = json.dumps(value, default=_encode_object)
+        except (TypeError, ValueError):
+            return
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                        (key, data, size, time.time()),
+                    )
+                    self._shrink()
+            except sqlite3.Error:
+                # the value is parsed again next time
+                pass
+
+    def info(self):
+        with self._lock:
+            size = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()[0]
+            return CacheInfo(
+                self.hits, self.misses, self.evictions, self.max_bytes, size
+            )
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM results")
+            self.hits = self.misses = self.evictions = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _shrink(self):
+        size = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        for key, entry_size in self._db.execute(
+            "SELECT key, size FROM results ORDER BY used, rowid"
+        ).fetchall():
+            if size <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            size -= entry_size
+            self.evictions += 1
+
+
+# the typed values are stored as objects of a single key starting with '#',
+# which no key of a result starts with
+_TAG_TIMESTAMP = "#timestamp"
+_TAG_IP = "#ip"
+_TIMESTAMP_FORMATS = ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S")
+
+
+def _encode_object(value):
+    if isinstance(value, datetime.datetime):
+        return {_TAG_TIMESTAMP: value.isoformat()}
+    if ipaddress is not None and isinstance(
+        value, (ipaddress.IPv4Address, ipaddress.IPv6Address)
+    ):
+        return {_TAG_IP: str(value)}
+    raise TypeError("{!r} cannot be stored as JSON".format(value))
+
+
+def _decode_object(value):
+    if len(value) != 1:
+        return value
+    if _TAG_TIMESTAMP in value:
+        return _timestamp(value[_TAG_TIMESTAMP])
+    if _TAG_IP in value and ipaddress is not None:
+        return ipaddress.ip_address(value[_TAG_IP])
+    return value
+
+
+def _timestamp(text):
+    fromisoformat = getattr(datetime.datetime, "fromisoformat", None)
+    if fromisoformat is not None:
+        return fromisoformat(text)
+    # python 3.6 and older, only naive timestamps are written without offset
+    for format in _TIMESTAMP_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, format)
+        except ValueError:
+            pass
+    raise ValueError("Invalid timestamp '{}'".format(text))
+
+
+def result_key(text, struct, *options):
+    """
+    Returns the digest of a text, of the struct and of the options of a
+    parse. A list of lines has the digest of the lines joined, and a text
+    the digest of its encoding in utf-8.
+    """
+    digest = _hash()
+    digest.update(json.dumps([struct, options], default=repr).encode("utf-8"))
+    if isinstance(text, (list, tuple)):
+        for index, line in enumerate(text):
+            if index > 0:
+                digest.update(b"\n")
+            _update(digest, line)
+    else:
+        _update(digest, text)
+    return digest.hexdigest()
+
+
+def _update(digest, text):
+    if isinstance(text, six.text_type):
+        text = text.encode("utf-8", "surrogatepass")
+    # bytes, bytearray, memoryview and mmap objects are hashed in place
+    digest.update(text)
+
+
+def _hash():
+    # blake2b is much faster than sha1 on big texts, it requires python 3.6
+    blake2b = getattr(hashlib, "blake2b", None)
+    if blake2b is not None:
+        return blake2b(digest_size=20)
+    return hashlib.sha1()
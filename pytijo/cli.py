@@ -0,0 +1,283 @@
+"""
+Parses files with a struct and writes the results as NDJSON.
+
+    pytijo struct.json 'archive/**/*.txt' --workers 32 --output results.ndjson
+
+Each line of the output is the record of a file: its ``path`` and the
+``result`` of its parse, or the ``error`` raised while parsing it. The
+files are parsed in a pool of workers, each file being read through a
+memory map and parsed without being decoded. The time each file took and
+the throughput of the whole run are reported on the standard error.
+"""
+
+import io
+import os
+import sys
+import glob
+import json
+import mmap
+import timeit
+import argparse
+import collections
+
+import six
+
+from . import plan as _plan
+from . import parallel as _parallel
+from .constants import DEFAULT_ENCODING
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# the parse of a file, ``line`` being its NDJSON record
+FileResult = collections.namedtuple(
+    "FileResult", ["path", "line", "size", "seconds", "error"]
+)
+
+_GLOB_CHARS = ("*", "?", "[")
+_GLOB_OPTIONS = {"recursive": True} if sys.version_info >= (3, 5) else {}
+
+
+def main(argv=None):
+    args = _arguments().parse_args(argv)
+    struct = load_struct(args.struct)
+    # a bad struct fails here rather than in every worker
+    _plan.compile(struct)
+
+    paths = expand(args.files)
+    if args.files_from:
+        paths = _chain(paths, _read_paths(args.files_from))
+
+    output = _open_output(args.output)
+    stats = Stats()
+    report = None if args.quiet else sys.stderr
+    try:
+        for result in parse_files(
+            paths,
+            struct,
+            workers=args.workers,
+            executor=args.executor,
+            ordered=args.ordered,
+            batch_size=args.batch_size,
+            encoding=args.encoding,
+        ):
+            output.write(six.text_type(result.line + "\n"))
+            stats.add(result)
+            if report is not None:
+                report.write(_format_file(result))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    sys.stderr.write(stats.report())
+    return 1 if stats.errors > 0 else 0
+
+
+def parse_files(
+    paths,
+    struct,
+    workers=None,
+    executor="process",
+    ordered=False,
+    batch_size=_parallel.DEFAULT_BATCH_SIZE,
+    encoding=DEFAULT_ENCODING,
+):
+    """
+    Parses the files at ``paths`` in a pool of workers, see
+    ``parallel.map_batches``, and yields their ``FileResult`` as they are
+    parsed, or in the order of ``paths`` when ``ordered`` is True. The
+    workers encode the records themselves, only their lines are sent back.
+    """
+    results = _parallel.map_batches(
+        parse_file,
+        paths,
+        struct,
+        workers=workers,
+        executor=executor,
+        ordered=ordered,
+        batch_size=batch_size,
+        args=(encoding,),
+        failed=_failed,
+    )
+    for result in results:
+        yield result if ordered else result[1]
+
+
+def parse_file(path, plan, encoding=DEFAULT_ENCODING):
+    """Parses the file at ``path`` with the plan and returns its ``FileResult``"""
+    clock = timeit.default_timer
+    start = clock()
+    size = 0
+    try:
+        with open(path, "rb") as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size == 0:
+                # empty files cannot be mapped
+                result = plan.parse(b"", encoding)
+            else:
+                text = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    result = plan.parse(text, encoding)
+                finally:
+                    text.close()
+        record = {"path": path, "result": result}
+        error = None
+    except Exception as e:
+        error = "{}: {}".format(type(e).__name__, e)
+        record = {"path": path, "error": error}
+    seconds = clock() - start
+    # the values JSON has no type for, e.g. timestamps, are written as strings
+    return FileResult(path, json.dumps(record, default=str), size, seconds, error)
+
+
+def load_struct(path):
+    """Loads the struct from a JSON file, or a YAML one when PyYAML is installed"""
+    with io.open(path, encoding="utf-8") as fp:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise ImportError("YAML structs require the 'PyYAML' package")
+            return yaml.safe_load(fp)
+        return json.load(fp, object_pairs_hook=collections.OrderedDict)
+
+
+def expand(patterns):
+    """Yields the paths of the files matching the patterns, in order"""
+    for pattern in patterns:
+        if any(char in pattern for char in _GLOB_CHARS):
+            for path in sorted(glob.iglob(pattern, **_GLOB_OPTIONS)):
+                if os.path.isfile(path):
+                    yield path
+        else:
+            yield pattern
+
+
+class Stats(object):
+    """The sizes and parse times of the files, and the time of the whole run"""
+
+    def __init__(self, clock=timeit.default_timer):
+        self.clock = clock
+        self.started = clock()
+        self.files = self.errors = self.bytes = 0
+        self.latencies = []
+
+    def add(self, result):
+        self.files += 1
+        self.bytes += result.size
+        self.latencies.append(result.seconds)
+        if result.error is not None:
+            self.errors += 1
+
+    def report(self):
+        elapsed = max(self.clock() - self.started, 1e-9)
+        latencies = sorted(self.latencies)
+        lines = [
+            "files: {} ({} errors)".format(self.files, self.errors),
+            "size: {:.2f} MB".format(self.bytes / 1e6),
+            "elapsed: {:.3f} s".format(elapsed),
+            "throughput: {:.2f} MB/s, {:.1f} files/s".format(
+                self.bytes / elapsed / 1e6, self.files / elapsed
+            ),
+        ]
+        if latencies:
+            lines.append(
+                "latency: p50 {:.1f} ms, p95 {:.1f} ms, max {:.1f} ms".format(
+                    _percentile(latencies, 0.5) * 1e3,
+                    _percentile(latencies, 0.95) * 1e3,
+                    latencies[-1] * 1e3,
+                )
+            )
+        return "".join(line + "\n" for line in lines)
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _format_file(result):
+    seconds = max(result.seconds, 1e-9)
+    return "{} {:.2f} MB {:.1f} ms {:.2f} MB/s{}\n".format(
+        result.path,
+        result.size / 1e6,
+        result.seconds * 1e3,
+        result.size / seconds / 1e6,
+        "" if result.error is None else " " + result.error,
+    )
+
+
+def _failed(path, exception):
+    # the whole batch of the file failed, e.g. its results could not be sent
+    # back from the worker
+    error = "{}: {}".format(type(exception).__name__, exception)
+    return FileResult(path, json.dumps({"path": path, "error": error}), 0, 0.0, error)
+
+
+def _read_paths(path):
+    fp = sys.stdin if path == "-" else io.open(path, encoding="utf-8")
+    try:
+        for line in fp:
+            line = line.strip()
+            if line:
+                yield line
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+
+
+def _chain(*iterables):
+    for iterable in iterables:
+        for item in iterable:
+            yield item
+
+
+def _open_output(path):
+    if path is None or path == "-":
+        return sys.stdout
+    return io.open(path, "w", encoding="utf-8")
+
+
+def _arguments():
+    arguments = argparse.ArgumentParser(
+        prog="pytijo", description=__doc__.strip().splitlines()[0]
+    )
+    arguments.add_argument("struct", help="the struct, a JSON or YAML file")
+    arguments.add_argument(
+        "files", nargs="*", help="the files to parse, or glob patterns of them"
+    )
+    arguments.add_argument(
+        "--files-from",
+        metavar="FILE",
+        help="a file listing the files to parse, one per line, '-' for stdin",
+    )
+    arguments.add_argument(
+        "-o", "--output", help="the NDJSON file to write, stdout by default"
+    )
+    arguments.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="the number of workers, one per CPU by default",
+    )
+    arguments.add_argument(
+        "--executor", choices=("process", "thread"), default="process"
+    )
+    arguments.add_argument(
+        "--batch-size",
+        type=int,
+        default=_parallel.DEFAULT_BATCH_SIZE,
+        help="the number of files sent to a worker at once",
+    )
+    arguments.add_argument(
+        "--ordered",
+        action="store_true",
+        help="write the records in the order of the files",
+    )
+    arguments.add_argument("--encoding", default=DEFAULT_ENCODING)
+    arguments.add_argument(
+        "-q", "--quiet", action="store_true", help="only report the totals"
+    )
+    return arguments
+
+
+if __name__ == "__main__":
+    sys.exit(main())
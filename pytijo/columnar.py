@@ -0,0 +1,130 @@
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# array type codes of the columns of numbers, tried in order
+_TYPECODES = {"int": ("q", "Q"), "hex": ("q", "Q"), "float": ("d",)}
+
+
+class Columns(dict):
+    """
+    The items of a list of the struct stored by column: a dictionary of the
+    keys of the items to the list of their values, one per item. The
+    columns of the keys typed as numbers are ``array.array`` objects, or
+    NumPy arrays, when all the items have a value, which ``numpy.asarray``
+    or ``pandas.DataFrame`` take without converting every value.
+
+    The items of a list nested in the items of another list are stored
+    together in the column of that list, ``offsets`` telling which of them
+    belong to each item: the nested items of item ``i`` are the ones from
+    ``offsets[i]`` to ``offsets[i + 1]``. A dictionary nested in the items is
+    stored as ``Columns`` too, with one row per item.
+    """
+
+    __slots__ = ("length", "offsets")
+
+    def __init__(self, columns, length, offsets=None):
+        super(Columns, self).__init__(columns)
+        self.length = length
+        self.offsets = offsets
+
+    def row(self, index):
+        """Returns the item at ``index`` as a dictionary"""
+        return dict((key, _cell(column, index)) for key, column in self.items())
+
+    def rows(self):
+        """
+        Returns the items as the list of dictionaries of a plain parse, but
+        for the nested lists and dictionaries which are missing: they are
+        empty lists and dictionaries of None values
+        """
+        return [self.row(index) for index in range(self.length)]
+
+    def slice(self, start, end):
+        """Returns the items from ``start`` to ``end`` as a list of dictionaries"""
+        return [self.row(index) for index in range(start, end)]
+
+
+def evaluate_columns(node, text, spans, nested=False, arrays="array"):
+    """
+    Evaluates the chunks of a list node into ``Columns``. A span can be None
+    for an item which is missing, all its values are None then.
+
+    With ``nested`` the lists and dictionaries of the items are stored by
+    column too. ``arrays`` is either 'array' or 'numpy', the type of the
+    columns of numbers.
+    """
+    values = [[] for _ in node.fields]
+    missing = [None] * len(node.fields)
+    for span in spans:
+        if span is None:
+            row = missing
+        else:
+            row = node.evaluate_values(text, span[0], span[1], None, not nested)
+        for column, value in zip(values, row):
+            column.append(value)
+
+    # a key repeated in the struct is parsed as its last occurrence
+    columns = {}
+    for field, column in zip(node.fields, values):
+        if nested and getattr(field, "fields", None) is not None:
+            columns[field.key] = _nested_columns(field, text, spans, arrays)
+        else:
+            columns[field.key] = column_of(column, value_type(field), arrays)
+    return Columns(columns, len(spans))
+
+
+def _nested_columns(node, text, spans, arrays):
+    if node.is_list and node.start is not None:
+        items = []
+        offsets = [0]
+        for span in spans:
+            if span is not None:
+                items.extend(node.spans(text, span[0], span[1]) or ())
+            offsets.append(len(items))
+        columns = evaluate_columns(node, text, items, True, arrays)
+        columns.offsets = column_of(offsets, "int", arrays)
+        return columns
+
+    rows = []
+    for span in spans:
+        if span is not None and node.start is not None:
+            chunks = node.spans(text, span[0], span[1])
+            span = chunks[0] if chunks else None
+        rows.append(span)
+    return evaluate_columns(node, text, rows, True, arrays)
+
+
+def value_type(field):
+    """The name of the type the values of a leaf are converted to, if any"""
+    spec = getattr(field, "spec", None)
+    if spec is None or getattr(spec, "is_list", False):
+        return None
+    return getattr(spec, "type", None)
+
+
+def column_of(values, type_name, arrays="array"):
+    """Stores the values in an array when their type allows, a list otherwise"""
+    for typecode in _TYPECODES.get(type_name, ()):
+        try:
+            column = array.array(typecode, values)
+        except (TypeError, OverflowError, ValueError):
+            continue
+        if arrays == "numpy" and numpy is not None:
+            # the array shares the memory of the column, nothing is copied
+            return numpy.frombuffer(column, dtype=typecode)
+        return column
+    return values
+
+
+def _cell(column, index):
+    if isinstance(column, Columns):
+        if column.offsets is None:
+            return column.row(index)
+        return column.slice(column.offsets[index], column.offsets[index + 1])
+    value = column[index]
+    # the items of numpy arrays are numpy scalars
+    return value.item() if hasattr(value, "item") else value
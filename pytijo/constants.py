@@ -4,7 +4,10 @@ KEYWORD_CHAR = "#"
 KEYWORD_ID = "#id"
 KEYWORD_START = "#start"
 KEYWORD_END = "#end"
+KEYWORD_COLUMNAR = "#columnar"
 # Modules
 MODULE_CHAR = "@"
 CORE_MODULE_PACKAGE = "pytijo.modules"
 DEFAULT_MODULE_NAME = "tijo_re"
+# Binary inputs
+DEFAULT_ENCODING = "utf-8"
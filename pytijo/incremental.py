@@ -0,0 +1,176 @@
+import collections
+
+import six
+
+from . import cache
+from . import plan as _plan
+from .constants import DEFAULT_ENCODING
+
+Change = collections.namedtuple("Change", ["kind", "path", "old", "new"])
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+_MISSING = object()
+
+
+class IncrementalParser(object):
+    """
+    Parses successive versions of the same output, e.g. the flow dump of a
+    device polled every few seconds, reparsing only the chunks of the lists
+    that changed since the previous version.
+
+    The parsed items of the chunks are kept by the digest of the chunk text,
+    at every level of nested lists, and reused when the same chunk is found again. A chunk is
+    parsed from its own text only, so a reused item equals the one a full
+    parse gives. The items that are reused are the same objects in both
+    results, they must not be modified.
+    """
+
+    def __init__(self, struct, encoding=DEFAULT_ENCODING):
+        self.plan = _plan.compile(struct)
+        self.encoding = encoding
+        self.previous = None
+        # items of the latest version by list node and chunk digest
+        self._items = {}
+        # chunks reused and parsed by the latest parse
+        self.reused = self.parsed = 0
+
+    def parse(self, text, diff=False):
+        """
+        Parses a new version of the text. With ``diff`` a ``(result,
+        changes)`` pair is returned, ``changes`` being the list items added,
+        removed or changed since the previous version, see ``diff``.
+        """
+        plan, text = self.plan.prepare(text, self.encoding)
+        if plan is None:
+            result = None
+        else:
+            previous_items = self._items
+            self._items = {}
+            self.reused = self.parsed = 0
+            result = plan.evaluate(text, 0, len(text), self._mapper(previous_items))
+
+        previous, self.previous = self.previous, result
+        if diff:
+            return result, list(_diff(previous, result))
+        return result
+
+    def reset(self):
+        """Forgets the previous version, the next text is fully parsed"""
+        self.previous = None
+        self._items = {}
+
+    def _mapper(self, previous_items):
+        # the entries of the chunks are ``(item, nested)`` pairs, ``nested``
+        # being the ``(node, digest, entry)`` of the chunks of the lists inside
+        # the item, which are kept along with it when it is reused
+        collectors = []
+
+        def map_chunks(node, text, spans):
+            known = previous_items.get(node, {})
+            items = self._items.setdefault(node, {})
+            results = []
+            for start, end in spans:
+                chunk = _digest(text, start, end)
+                entry = items.get(chunk)
+                if entry is None:
+                    entry = known.get(chunk)
+                if entry is None:
+                    collectors.append([])
+                    try:
+                        item = node.evaluate_fields(text, start, end, map_chunks)
+                    finally:
+                        nested = collectors.pop()
+                    entry = (item, tuple(nested))
+                    self.parsed += 1
+                else:
+                    self._keep(entry)
+                    self.reused += 1
+                items[chunk] = entry
+                if collectors:
+                    collectors[-1].append((node, chunk, entry))
+                results.append(entry[0])
+            return results
+
+        return map_chunks
+
+    def _keep(self, entry):
+        # the chunks of the lists of a reused item are not visited, they are
+        # kept for the next versions, where the item may change
+        for node, chunk, nested in entry[1]:
+            self._items.setdefault(node, {})[chunk] = nested
+            self._keep(nested)
+
+
+def _digest(text, start, end):
+    # the chunks are only kept by digest, rather than holding a copy of the
+    # text of every chunk of the previous version
+    digest = cache._hash()
+    if isinstance(text, six.text_type):
+        cache._update(digest, text[start:end])
+    else:
+        cache._update(digest, memoryview(text)[start:end])
+    return digest.digest()
+
+
+def diff(old, new):
+    """
+    Returns the ``Change`` of every list item added, removed or changed
+    between two results of the same struct. The items of a list are matched
+    by their 'id' when they all have a distinct one, by position otherwise.
+    ``path`` is the tuple of keys and item ids (or positions) leading to the
+    item, e.g. ``('tables', '0', 'flows', '12')``. An item is changed when one
+    of its values other than its lists changed, the changes inside its
+    lists are reported on their own.
+    """
+    return list(_diff(old, new))
+
+
+def _diff(old, new, path=()):
+    if old is new:
+        return
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return
+    for key in new:
+        if _is_items(new[key]) or _is_items(old.get(key)):
+            for change in _diff_items(old.get(key), new[key], path + (key,)):
+                yield change
+
+
+def _diff_items(old, new, path):
+    old_items = _keyed(old or [])
+    new_items = _keyed(new or [])
+    for key, item in old_items.items():
+        if key not in new_items:
+            yield Change(REMOVED, path + (key,), item, None)
+    for key, item in new_items.items():
+        previous = old_items.get(key)
+        if previous is None:
+            yield Change(ADDED, path + (key,), None, item)
+            continue
+        if previous is item:
+            continue
+        if _values(previous) != _values(item):
+            yield Change(CHANGED, path + (key,), previous, item)
+        for change in _diff(previous, item, path + (key,)):
+            yield change
+
+
+def _keyed(items):
+    ids = [item.get("id") if isinstance(item, dict) else None for item in items]
+    if None not in ids and len(set(ids)) == len(ids):
+        return collections.OrderedDict(zip(ids, items))
+    return collections.OrderedDict((str(i), item) for i, item in enumerate(items))
+
+
+def _values(item):
+    # the values of an item other than its lists of items
+    if not isinstance(item, dict):
+        return item
+    return dict((k, v) for k, v in item.items() if not _is_items(v))
+
+
+def _is_items(value):
+    return isinstance(value, list) and any(isinstance(v, dict) for v in value)
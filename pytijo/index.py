@@ -0,0 +1,55 @@
+import re
+
+from . import cache
+
+
+class TextIndex(object):
+    """
+    The offsets of the literals looked up in a text, found once per text.
+    The regexes starting with a literal are then only tried where the
+    literal is, rather than scanned over the whole span they are applied to.
+    """
+
+    __slots__ = ("text", "_offsets")
+
+    def __init__(self, text):
+        self.text = text
+        self._offsets = {}
+
+    def offsets(self, literal):
+        """Returns the sorted offsets of all the occurrences of ``literal``"""
+        offsets = self._offsets.get(literal)
+        if offsets is None:
+            offsets = self._offsets[literal] = _find_all(self.text, literal)
+        return offsets
+
+
+def _find_all(text, literal):
+    pattern = re.escape(literal)
+    if _overlaps(literal):
+        # every occurrence is needed, e.g. both 'aa' of 'aaa', the lookahead
+        # finds the overlapping ones too
+        if isinstance(pattern, bytes):
+            pattern = b"(?=" + pattern + b")"
+        else:
+            pattern = "(?=" + pattern + ")"
+    regex = cache.compile_pattern(pattern)
+    return [match.start() for match in regex.finditer(text)]
+
+
+def _overlaps(literal):
+    # whether two occurrences of the literal can overlap, that is whether it
+    # ends with one of its own prefixes
+    return any(literal[:size] == literal[-size:] for size in range(1, len(literal)))
+
+
+def contains(text, literal, pos=0, endpos=None):
+    """
+    Whether the literal is in the span ``pos:endpos`` of the text, which is
+    much faster to tell than scanning the span with a regex
+    """
+    try:
+        return text.find(literal, pos, endpos) >= 0
+    except AttributeError:
+        # memoryview objects cannot be searched
+        return True
@@ -0,0 +1,245 @@
+import threading
+import collections
+import timeit
+
+from . import plan as _plan
+from .index import contains
+
+NodeStats = collections.namedtuple(
+    "NodeStats",
+    ["path", "calls", "seconds", "scans", "scanned", "chunks", "matches"],
+)
+
+ROOT_PATH = "<root>"
+
+
+class Profiler(object):
+    """
+    Records how every key of the structs parsed while it is active is
+    evaluated. The keys are identified by their path in the parsed output,
+    e.g. 'tables[].flows[].instructions.apply_actions', and for each one
+    the profiler counts:
+
+    - calls: the times the key was evaluated, once per item for lists
+    - seconds: the wall time spent, including the keys inside it
+    - scans: the passes of a regex over the text, finding the chunks of a
+      list counts as one
+    - scanned: the characters, or bytes, those passes went over
+    - chunks: the chunks found for the '#id'/'#start' keys
+    - matches: the values found, the items of list values included
+
+    The structs are evaluated through an instrumented copy of their plan,
+    so the plans are as fast as ever when no profiler is active.
+    """
+
+    def __init__(self, sink=None, clock=timeit.default_timer):
+        self.sink = sink
+        self.clock = clock
+        self._stats = collections.OrderedDict()
+        self._instrumented = {}
+        self._lock = threading.Lock()
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = getattr(_plan.profiling, "profiler", None)
+        _plan.profiling.profiler = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _plan.profiling.profiler = self._previous
+        self._previous = None
+        if self.sink is not None:
+            for stats in self.stats():
+                self.sink(stats)
+        return False
+
+    def instrument(self, root):
+        """Returns the instrumented copy of the root of a plan"""
+        with self._lock:
+            entry = self._instrumented.get(id(root))
+            if entry is None or entry[0] is not root:
+                # the plan is kept so that its id is not reused
+                entry = (root, _instrument(root, None, self))
+                self._instrumented[id(root)] = entry
+            return entry[1]
+
+    def record(
+        self, path, calls=0, seconds=0.0, scans=0, scanned=0, chunks=0, matches=0
+    ):
+        with self._lock:
+            stats = self._stats.get(path)
+            if stats is None:
+                stats = self._stats[path] = [0, 0.0, 0, 0, 0, 0]
+            stats[0] += calls
+            stats[1] += seconds
+            stats[2] += scans
+            stats[3] += scanned
+            stats[4] += chunks
+            stats[5] += matches
+
+    def stats(self, sort="seconds"):
+        """
+        Returns the ``NodeStats`` of every path, sorted by the given field in
+        decreasing order or in the order of the struct if ``sort`` is None
+        """
+        with self._lock:
+            stats = [NodeStats(path, *values) for path, values in self._stats.items()]
+        if sort is not None:
+            stats.sort(key=lambda s: getattr(s, sort), reverse=True)
+        return stats
+
+    def report(self, sort="seconds", limit=None):
+        """Returns the stats as a table, the most expensive keys first"""
+        stats = self.stats(sort)[:limit]
+        width = max([len(s.path) for s in stats] + [len("path")])
+        line = "{:<{width}} {:>8} {:>10} {:>8} {:>12} {:>8} {:>8}"
+        lines = [
+            line.format(
+                "path",
+                "calls",
+                "seconds",
+                "scans",
+                "scanned",
+                "chunks",
+                "matches",
+                width=width,
+            )
+        ]
+        for s in stats:
+            lines.append(
+                line.format(
+                    s.path,
+                    s.calls,
+                    "{:.6f}".format(s.seconds),
+                    s.scans,
+                    s.scanned,
+                    s.chunks,
+                    s.matches,
+                    width=width,
+                )
+            )
+        return "\n".join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def profile(sink=None):
+    """
+    Returns a ``Profiler`` to be used as a context manager around the parses
+    to profile. ``sink`` is called with the ``NodeStats`` of every path
+    when the context ends.
+
+        with profile() as profiler:
+            parser.parse(text, struct)
+        print(profiler.report())
+
+    Only the parses started by the current thread are profiled, the ones of
+    other threads and of the workers of a process pool are not.
+    """
+    return Profiler(sink=sink)
+
+
+class _ProfiledLeaf(_plan._Leaf):
+    __slots__ = ("path", "profiler")
+
+    def extract(self, text, pos=0, endpos=None, index=None):
+        if endpos is None:
+            endpos = len(text)
+        clock = self.profiler.clock
+        started = clock()
+        value = _plan._Leaf.extract(self, text, pos, endpos, index)
+        seconds = clock() - started
+        # the modules tell the scans they did, the spans they skipped thanks
+        # to a missing literal or to the index of the text are not scanned
+        scans = getattr(self.module, "scans", None)
+        if self.spec is None or scans is None:
+            scans, scanned = 1, endpos - pos
+        else:
+            if index is not None and _plan._indexed_lookup(self.module) is None:
+                index = None
+            scans, scanned = scans(text, self.spec, pos, endpos, index)
+        self.profiler.record(
+            self.path,
+            calls=1,
+            seconds=seconds,
+            scans=scans,
+            scanned=scanned,
+            matches=_matches(value),
+        )
+        return value
+
+
+class _ProfiledStruct(_plan._Struct):
+    __slots__ = ("path", "profiler")
+
+    def spans(self, text, pos, endpos):
+        clock = self.profiler.clock
+        started = clock()
+        spans = _plan._Struct.spans(self, text, pos, endpos)
+        seconds = clock() - started
+        # the span is not chunked when the literal of '#id'/'#start' is missing
+        skipped = self.literal is not None and not contains(
+            text, self.literal, pos, endpos
+        )
+        self.profiler.record(
+            self.path,
+            seconds=seconds,
+            scans=0 if skipped else 1,
+            scanned=0 if skipped else endpos - pos,
+            chunks=len(spans or ()),
+        )
+        return spans
+
+    def evaluate_fields(self, text, pos, endpos, map_chunks=None):
+        values = self.evaluate_values(text, pos, endpos, map_chunks)
+        return dict(zip(self.keys, values))
+
+    def extract_batches(self, text, pos, endpos):
+        batched = _plan._Struct.extract_batches(self, text, pos, endpos)
+        for _ in self.batches:
+            self.profiler.record(self.path, scans=1, scanned=endpos - pos)
+        # the leaves extracted in a batch are counted as evaluated, their time
+        # and scan are the ones of the batch
+        for position, value in batched.items():
+            self.profiler.record(
+                self.fields[position].path, calls=1, matches=_matches(value)
+            )
+        return batched
+
+    def evaluate_values(self, text, pos, endpos, map_chunks=None, structs=True):
+        clock = self.profiler.clock
+        started = clock()
+        values = _plan._Struct.evaluate_values(
+            self, text, pos, endpos, map_chunks, structs
+        )
+        self.profiler.record(self.path, calls=1, seconds=clock() - started)
+        return values
+
+
+def _instrument(node, parent_path, profiler):
+    if parent_path is None:
+        path = ROOT_PATH
+    else:
+        prefix = "" if parent_path == ROOT_PATH else parent_path + "."
+        path = prefix + node.key
+        if getattr(node, "is_list", False) and getattr(node, "start", None):
+            path += "[]"
+
+    if isinstance(node, _plan._Struct):
+        copy = _plan.copy_node(node, _ProfiledStruct)
+        copy.fields = tuple(_instrument(f, path, profiler) for f in node.fields)
+    else:
+        copy = _plan.copy_node(node, _ProfiledLeaf)
+    copy.path = path
+    copy.profiler = profiler
+    return copy
+
+
+def _matches(value):
+    if value is None:
+        return 0
+    if isinstance(value, list):
+        return len(value)
+    return 1
@@ -0,0 +1,115 @@
+import collections
+
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:  # python 2
+    from collections import Mapping, Sequence
+
+
+class LazyDict(Mapping):
+    """
+    The parsed value of a dictionary of the struct, whose keys are only
+    evaluated when they are first accessed and then kept. It holds on to the
+    parsed text, which must not change nor be closed while the value is
+    used.
+    """
+
+    __slots__ = ("_node", "_text", "_pos", "_endpos", "_fields", "_values")
+
+    def __init__(self, node, text, pos, endpos):
+        self._node = node
+        self._text = text
+        self._pos = pos
+        self._endpos = endpos
+        # a key repeated in the struct is parsed as its last occurrence
+        self._fields = collections.OrderedDict()
+        for field in node.fields:
+            self._fields[field.key] = field
+        self._values = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        value = evaluate(self._fields[key], self._text, self._pos, self._endpos)
+        self._values[key] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return "<LazyDict keys={}>".format(list(self._fields))
+
+    def materialize(self):
+        """Returns the value as plain dictionaries and lists, all keys evaluated"""
+        return dict((key, materialize(self[key])) for key in self._fields)
+
+
+class LazyList(Sequence):
+    """The parsed items of a list of the struct, evaluated on first access"""
+
+    __slots__ = ("_node", "_text", "_spans", "_items")
+
+    def __init__(self, node, text, spans):
+        self._node = node
+        self._text = text
+        self._spans = spans
+        self._items = [None] * len(spans)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._spans)))]
+        item = self._items[index]
+        if item is None:
+            start, end = self._spans[index]
+            item = self._items[index] = LazyDict(self._node, self._text, start, end)
+        return item
+
+    def __len__(self):
+        return len(self._spans)
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, tuple, LazyList)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "<LazyList items={}>".format(len(self._spans))
+
+    def materialize(self):
+        return [item.materialize() for item in self]
+
+
+def evaluate(node, text, pos, endpos):
+    """
+    Evaluates a node of a plan lazily: the leaves are extracted right away
+    and the dictionaries are returned as ``LazyDict`` and ``LazyList``
+    """
+    if getattr(node, "fields", None) is None:
+        return node.evaluate(text, pos, endpos)
+    if node.start is None:
+        return LazyDict(node, text, pos, endpos)
+    spans = node.spans(text, pos, endpos)
+    if spans is None:
+        return None
+    if node.is_list:
+        return LazyList(node, text, spans)
+    return LazyDict(node, text, *spans[0])
+
+
+def materialize(value):
+    """Returns a parsed value with its lazy parts evaluated"""
+    if isinstance(value, (LazyDict, LazyList)):
+        return value.materialize()
+    return value
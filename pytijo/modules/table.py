@@ -0,0 +1,201 @@
+import re
+import six
+import collections
+from .. import cache
+from ..columnar import Columns, column_of
+from .tijo_re import converter
+
+TIJO_METADATA = {
+    "metadata_version": "0.1",
+    "status": ["preview"],
+    "supported_by": "community",
+}
+
+DOCUMENTATION = r"""
+---
+module: table
+short_description: Parse the rows of fixed-width tables
+description:
+  - This module parses tables whose columns are aligned under a header line, like the outputs of netstat, ps or show ip route.
+  - The header is found once, the offsets of its titles tell where each column starts, and every row is sliced at those offsets in a single pass.
+  - A value crossing the start of a column, e.g. a number right aligned under its title, is kept whole in the column holding most of it.
+  - The rows end at the first blank line, or at the first line matching end. Lines made only of dashes, equal signs, pluses and pipes are skipped.
+  - The value can be the list of the titles of the columns, the keys of the rows being the titles in lower case with underscores.
+version_added: "0.1"
+options:
+  columns:
+    description:
+      - The titles of all the columns, in the order they appear in the header.
+      - A dictionary maps the keys of the rows to the titles, in the same order.
+    type: list|dict
+  types:
+    description:
+      - Types the values of the columns are converted to, by key, see the type option of tijo_re.
+    type: dict
+  end:
+    description:
+      - A regular expression matching the line after the last row.
+    type: str
+  columnar:
+    description:
+      - Return the rows as columns, a list of values per key.
+    type: bool
+"""
+
+ATTR_COLUMNS = "columns"
+ATTR_TYPES = "types"
+ATTR_END = "end"
+ATTR_COLUMNAR = "columnar"
+
+# characters of the lines drawn between the header and the rows
+_RULE_CHARS = frozenset("-=+| \t")
+_RULE_STARTS = frozenset("-=+|")
+_BINARY_RULE_STARTS = frozenset(c.encode("ascii") for c in _RULE_STARTS)
+
+Spec = collections.namedtuple(
+    "Spec",
+    ["key", "header", "keys", "end", "types", "converters", "columnar", "encoding"],
+)
+
+
+def parse(text, key, value):
+    return extract(text, compile(key, value))
+
+
+def compile(key, value, encoding=None, backend=None):
+    """
+    Validates the value given at ``key`` and precompiles the regex finding
+    the header of the table
+    """
+    if isinstance(value, (list, tuple)):
+        value = {ATTR_COLUMNS: value}
+    if not isinstance(value, dict) or not value.get(ATTR_COLUMNS):
+        raise TypeError(
+            "The value at key '{}' must be the list of the titles of the "
+            "columns".format(key)
+        )
+
+    columns = value[ATTR_COLUMNS]
+    if isinstance(columns, dict):
+        keys, titles = list(columns.keys()), list(columns.values())
+    else:
+        titles = list(columns)
+        keys = [_key_of(title) for title in titles]
+    if not all(isinstance(title, six.string_types) for title in titles):
+        raise TypeError(
+            "The titles of the columns at key '{}' must be strings".format(key)
+        )
+
+    header = r"^[ \t]*" + r"[ \t]+".join(
+        "({})".format(re.escape(title)) for title in titles
+    )
+    end = value.get(ATTR_END)
+    if encoding is not None:
+        header = header.encode(encoding)
+        end = None if end is None else end.encode(encoding)
+    header = cache.compile_pattern(header, re.MULTILINE, backend=backend)
+    end = None if end is None else cache.compile_pattern(end, backend=backend)
+
+    types = value.get(ATTR_TYPES) or {}
+    converters = tuple(converter(types[k]) if k in types else None for k in keys)
+    return Spec(
+        key,
+        header,
+        tuple(keys),
+        end,
+        tuple(types.get(k) for k in keys),
+        converters,
+        bool(value.get(ATTR_COLUMNAR, False)),
+        encoding,
+    )
+
+
+def extract(text, spec, pos=0, endpos=None):
+    """
+    Returns the rows of the table found in the span ``pos:endpos`` of the
+    text, as a list of dictionaries or as ``Columns``, None if there is no
+    table
+    """
+    if endpos is None:
+        endpos = len(text)
+    if not hasattr(text, "find"):
+        # memoryview objects cannot be searched, the span is copied once
+        text = bytes(text[pos:endpos])
+        pos, endpos = 0, len(text)
+
+    match = spec.header.search(text, pos, endpos)
+    if match is None:
+        return None
+    line_start = match.start()
+    offsets = [match.start(i) - line_start for i in range(2, len(spec.keys) + 1)]
+
+    if isinstance(text, six.text_type):
+        newline, space, rules = "\n", " ", _RULE_STARTS
+    else:
+        newline, space, rules = b"\n", b" ", _BINARY_RULE_STARTS
+    columns = [[] for _ in spec.keys]
+    position = text.find(newline, match.end(), endpos)
+    while 0 <= position < endpos:
+        start = position + 1
+        position = text.find(newline, start, endpos)
+        line = text[start : endpos if position < 0 else position].rstrip()
+        if len(line) <= 0 or (spec.end is not None and spec.end.match(line)):
+            break
+        if line.lstrip()[:1] in rules and _is_rule(line):
+            continue
+        for column, cell in zip(columns, _cells(line, offsets, space)):
+            column.append(cell)
+
+    for index, column in enumerate(columns):
+        convert = spec.converters[index]
+        if spec.encoding is not None:
+            column[:] = [_decode(cell, spec.encoding) for cell in column]
+        if convert is not None:
+            column[:] = [None if cell is None else convert(cell) for cell in column]
+
+    if spec.columnar:
+        length = len(columns[0]) if columns else 0
+        return Columns(
+            dict(
+                (key, column_of(column, type_name))
+                for key, column, type_name in zip(spec.keys, columns, spec.types)
+            ),
+            length,
+        )
+    return [dict(zip(spec.keys, row)) for row in zip(*columns)]
+
+
+def _cells(line, offsets, space):
+    # the line is cut at the offsets of the titles, but a value crossing an
+    # offset is kept whole, in the column holding most of it
+    cells = []
+    previous = 0
+    size = len(line)
+    for offset in offsets:
+        cut = offset if offset > previous else previous
+        if cut < size and space not in line[cut - 1 : cut + 1]:
+            left = max(line.rfind(space, previous, cut) + 1, previous)
+            right = line.find(space, cut)
+            if right < 0:
+                right = size
+            cut = left if right - cut >= cut - left else right
+        cells.append(line[previous:cut].strip() or None)
+        previous = cut
+    cells.append(line[previous:].strip() or None)
+    return cells
+
+
+def _is_rule(line):
+    if isinstance(line, bytes):
+        line = line.decode("latin-1")
+    return all(char in _RULE_CHARS for char in line)
+
+
+def _decode(value, encoding):
+    if value is None or isinstance(value, six.text_type):
+        return value
+    return six.binary_type(value).decode(encoding, "replace")
+
+
+def _key_of(title):
+    return re.sub(r"\W+", "_", title.strip().lower()).strip("_")
@@ -1,6 +1,16 @@
 import six
 import re
+import bisect
+import datetime
+import collections
+from .. import cache
+from ..analysis import leading_class, literal_prefix, needs_context, required_literal
+from ..index import contains
 
+try:
+    import ipaddress
+except ImportError:  # python 2 without the 'ipaddress' backport
+    ipaddress = None
 
 TIJO_METADATA = {
     "metadata_version": "0.1",
@@ -28,19 +38,78 @@ options:
       - By default is 1 if at least a group if defined in the regex.
       - If the regex does not contain any group then it will take the only one defined on group 0.
     type: int
+  type:
+    description:
+      - Type the extracted value is converted to, one of int, float, hex (an integer written in hexadecimal), bool, ip or timestamp.
+      - Values that cannot be converted are null.
+    type: str
+  format:
+    description:
+      - The strptime format of the timestamps, ISO 8601 by default.
+    type: str
 
 """
 
 ATTR_REGEX = "regex"
 ATTR_GROUP = "group"
+ATTR_TYPE = "type"
+ATTR_FORMAT = "format"
+
+DEFAULT_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+_MISSING = object()
+
+# spans shorter than that are scanned even when the text is indexed
+INDEX_MIN_SPAN = 4096
+
+
+Spec = collections.namedtuple(
+    "Spec",
+    [
+        "key",
+        "regex",
+        "group",
+        "is_list",
+        "contextual",
+        "encoding",
+        "backend",
+        "prefix",
+        "literal",
+        "type",
+        "convert",
+    ],
+)
+MultiSpec = collections.namedtuple(
+    "MultiSpec", ["regex", "members", "dispatch", "anywhere"]
+)
+
+# constructs that depend on the group numbering or on global flags of the
+# pattern, they cannot be moved inside a combined pattern
+_UNMERGEABLE = re.compile(r"\\[1-9]|\(\?P[<=]|\(\?\(|\(\?[aiLmsux]+\)")
 
 
 def parse(text, key, value):
+    return extract(text, compile(key, value))
+
 
+def compile(key, value, encoding=None, backend=None):
+    """
+    Validates the value given at ``key`` and precompiles it so that it can be
+    applied to many texts through ``extract``. If an ``encoding`` is given,
+    the regex is compiled to be applied to bytes and the extracted values are
+    decoded with it. ``backend`` is the name of the regex engine to compile
+    it with, see ``pytijo.backends``.
+    """
     group = 1
     is_list = False
+    type_name = None
+    convert = None
     regex = value
     if isinstance(regex, (list, tuple)):
+        if len(regex) <= 0:
+            raise TypeError(
+                "The value at key '{}' must be a regular expression string".format(key)
+            )
         regex = regex[0]
         is_list = True
 
@@ -50,6 +119,9 @@ def parse(text, key, value):
             if ATTR_GROUP not in regex
             else int(_get_value(regex, ATTR_GROUP, default=1))
         )
+        type_name = _get_value(regex, ATTR_TYPE)
+        if type_name is not None:
+            convert = converter(type_name, _get_value(regex, ATTR_FORMAT))
         regex = _get_value(regex, ATTR_REGEX)
 
     if not isinstance(regex, six.string_types):
@@ -57,26 +129,282 @@ def parse(text, key, value):
             "The value at key '{}' must be a regular expression string".format(key)
         )
 
-    regex = re.compile(regex)
+    regex = cache.compile_pattern(
+        regex if encoding is None else regex.encode(encoding), backend=backend
+    )
     # first, try to use the group defined by the user
     # by default the first group is the one choosen
     # if not parenthesis are provided in the regex then use group 0
     group = group if regex.groups >= group else 1 if regex.groups > 0 else 0
+    contextual = needs_context(regex)
+    # the literal every match starts with, matches are looked up from its
+    # occurrences when the text is indexed
+    prefix = None if contextual else literal_prefix(regex)
+    # a span without the literal every match contains is not scanned at all.
+    # The engine finds a literal prefix quickly on its own, the literal is
+    # only worth looking up first when it is inside the regex.
+    literal = None if prefix is not None else required_literal(regex)
+    return Spec(
+        key,
+        regex,
+        group,
+        is_list,
+        contextual,
+        encoding,
+        backend,
+        prefix,
+        literal,
+        type_name,
+        convert,
+    )
+
+
+def extract(text, spec, pos=0, endpos=None):
+    if endpos is None:
+        endpos = len(text)
+    if spec.literal is not None and not contains(text, spec.literal, pos, endpos):
+        return None
+    # regexes looking behind the position they are applied from must see the
+    # text as if it started there
+    if spec.contextual and pos > 0:
+        text, pos, endpos = text[pos:endpos], 0, endpos - pos
     result = []
 
     # if the regexis provided as a list then we take as many values as possible
     # if not, we just take the first value
-    for match in regex.finditer(text):
-        result.append(match.group(group))
-        if is_list is False:
+    for match in spec.regex.finditer(text, pos, endpos):
+        value = match.group(spec.group)
+        if spec.encoding is not None or spec.convert is not None:
+            value = _value(value, spec)
+        result.append(value)
+        if spec.is_list is False:
             break
 
     # the result will be a list if the regex is provided as a list
-    if is_list is True:
+    if spec.is_list is True:
         return result if len(result) > 0 else None
     return result[0] if len(result) > 0 else None
 
 
+def extract_indexed(text, spec, index, pos=0, endpos=None):
+    """
+    Equal to ``extract``, the regex being only matched at the occurrences
+    of its literal prefix found by the ``TextIndex`` of the text
+    """
+    if endpos is None:
+        endpos = len(text)
+    # scanning a short span is cheaper than looking up the offsets
+    if spec.prefix is None or endpos - pos < INDEX_MIN_SPAN:
+        return extract(text, spec, pos, endpos)
+    offsets = index.offsets(spec.prefix)
+    count = len(offsets)
+    position = bisect.bisect_left(offsets, pos)
+    result = []
+    while position < count and offsets[position] < endpos:
+        match = spec.regex.match(text, offsets[position], endpos)
+        position += 1
+        if match is None:
+            continue
+        value = match.group(spec.group)
+        if spec.encoding is not None or spec.convert is not None:
+            value = _value(value, spec)
+        result.append(value)
+        if spec.is_list is False:
+            break
+        # matches found by finditer do not overlap
+        position = bisect.bisect_left(offsets, match.end(), position)
+
+    if spec.is_list is True:
+        return result if len(result) > 0 else None
+    return result[0] if len(result) > 0 else None
+
+
+def scans(text, spec, pos=0, endpos=None, index=None):
+    """
+    Returns the number of scans ``extract``, or ``extract_indexed`` when an
+    ``index`` is given, does over the span and the characters they go over.
+    Indexed lookups only try the regex at the offsets of its prefix.
+    """
+    if endpos is None:
+        endpos = len(text)
+    if index is not None and spec.prefix is not None and endpos - pos >= INDEX_MIN_SPAN:
+        return 0, 0
+    if spec.literal is not None and not contains(text, spec.literal, pos, endpos):
+        return 0, 0
+    return 1, endpos - pos
+
+
+def compile_many(specs):
+    """
+    Combines the scalar specs of the same struct level into a single pattern
+    so that all of them are extracted with one scan of the text. It returns
+    None when fewer than two specs can be combined.
+
+    Only the patterns starting with a character class are combined, the
+    engine looks up a literal prefix faster on its own than as part of an
+    alternation.
+    """
+    patterns = []
+    members = []
+    leading = []
+    binary = False
+    backend = None
+    for index, spec in enumerate(specs):
+        if spec.is_list or spec.contextual:
+            continue
+        if len(members) > 0 and spec.backend != backend:
+            continue
+        pattern = spec.regex.pattern
+        # byte patterns are combined as text, latin-1 maps each byte to the
+        # character of the same code
+        binary = isinstance(pattern, bytes)
+        if binary:
+            pattern = pattern.decode("latin-1")
+        if _UNMERGEABLE.search(pattern):
+            continue
+        mergeable, chars = leading_class(spec.regex)
+        if not mergeable:
+            continue
+        # non capturing groups keep the leading classes of the alternatives
+        # visible to the engine, which then skips quickly over the text
+        patterns.append("(?:{})".format(pattern))
+        members.append(index)
+        leading.append(chars)
+        backend = spec.backend
+
+    if len(members) < 2:
+        return None
+    combined = "|".join(patterns)
+    try:
+        regex = cache.compile_pattern(
+            combined.encode("latin-1") if binary else combined, backend=backend
+        )
+    except (re.error, OverflowError, AssertionError, ValueError):
+        return None
+
+    # which members may start at a given character
+    anywhere = tuple(m for m, chars in enumerate(leading) if chars is None)
+    dispatch = {}
+    for member, chars in enumerate(leading):
+        for char in chars or ():
+            dispatch.setdefault(char, set()).add(member)
+    dispatch = dict(
+        (char, tuple(sorted(candidates.union(anywhere))))
+        for char, candidates in six.iteritems(dispatch)
+    )
+    return MultiSpec(regex, tuple(members), dispatch, anywhere)
+
+
+def extract_many(text, multi, specs, pos=0, endpos=None):
+    """
+    Returns the values of the ``multi`` members in a single pass over the
+    text, equal to calling ``extract`` for each one of them
+    """
+    if endpos is None:
+        endpos = len(text)
+    results = [_MISSING] * len(multi.members)
+    remaining = len(results)
+    position = pos
+    while remaining > 0 and position <= endpos:
+        match = multi.regex.search(text, position, endpos)
+        if match is None:
+            break
+        # at least one of the members matches at this position, the ones
+        # that were not found yet are tried in the order of the struct
+        start = match.start()
+        char = text[start : min(start + 1, endpos)]
+        if not isinstance(char, (six.text_type, six.binary_type)):
+            char = six.binary_type(char)
+        candidates = multi.dispatch.get(char, multi.anywhere)
+        for member in candidates:
+            if results[member] is _MISSING:
+                spec = specs[multi.members[member]]
+                member_match = spec.regex.match(text, start, endpos)
+                if member_match is not None:
+                    value = member_match.group(spec.group)
+                    results[member] = _value(value, spec)
+                    remaining -= 1
+        position = start + 1
+    return [None if result is _MISSING else result for result in results]
+
+
+def converter(type_name, format=None):
+    """
+    Returns the function converting the extracted strings to ``type_name``,
+    it returns None for the values that cannot be converted
+    """
+    if type_name == "timestamp":
+        convert = _timestamp_converter(format or DEFAULT_TIMESTAMP_FORMAT)
+    elif type_name == "ip":
+        if ipaddress is None:
+            raise ImportError("The 'ip' type requires the 'ipaddress' package")
+        convert = _to_ip
+    else:
+        try:
+            convert = _CONVERTERS[type_name]
+        except (KeyError, TypeError):
+            raise ValueError(
+                "Unknown type '{}', it must be one of {}".format(
+                    type_name, ", ".join(sorted(TYPES))
+                )
+            )
+
+    def safe_convert(value):
+        try:
+            return convert(value)
+        except (ValueError, TypeError, OverflowError):
+            return None
+
+    return safe_convert
+
+
+def _to_ip(value):
+    return ipaddress.ip_address(six.text_type(value.strip()))
+
+
+def _timestamp_converter(format):
+    def convert(value):
+        return datetime.datetime.strptime(value.strip(), format)
+
+    return convert
+
+
+_BOOLEANS = {
+    "true": True,
+    "yes": True,
+    "on": True,
+    "enabled": True,
+    "1": True,
+    "false": False,
+    "no": False,
+    "off": False,
+    "disabled": False,
+    "0": False,
+}
+_CONVERTERS = {
+    "int": int,
+    "float": float,
+    "hex": lambda value: int(value, 16),
+    "bool": lambda value: _BOOLEANS.get(value.strip().lower()),
+}
+TYPES = frozenset(list(_CONVERTERS) + ["ip", "timestamp"])
+
+
+def _value(value, spec):
+    value = _decode(value, spec.encoding)
+    if spec.convert is None or value is None:
+        return value
+    return spec.convert(value)
+
+
+def _decode(value, encoding):
+    # values matched on bytes, mmap or memoryview objects are decoded, only
+    # what is extracted is ever converted to text
+    if encoding is None or value is None:
+        return value
+    return six.binary_type(value).decode(encoding, "replace")
+
+
 def _get_value(map, key, mandatory=False, default=None, allow_empty=True):
     result = map.get(key)
     if result is None:
@@ -0,0 +1,169 @@
+import six
+import copy
+import collections
+
+from . import cache
+from . import backends
+from . import plan as _plan
+from .constants import DEFAULT_ENCODING
+
+
+class MultiPlan(object):
+    """
+    Several structs compiled to be parsed together over the same text. The
+    dictionaries of the structs chunked by the same '#id'/'#start' and
+    '#end' regexes are merged, so their chunks are only looked for once and
+    the keys of all of them are extracted from each chunk together. The
+    leaves of the same module and value are extracted once, and the sibling
+    leaves of all the structs in a single scan.
+    """
+
+    __slots__ = ("structs", "encoding", "backend", "root")
+
+    def __init__(self, structs, encoding=None, backend=None):
+        if not isinstance(structs, dict):
+            raise TypeError("The structs must be a dictionary of structs by name")
+        self.structs = copy.deepcopy(structs)
+        self.encoding = encoding
+        self.backend = None
+        roots = []
+        for name, struct in six.iteritems(structs):
+            plan = _plan.compile(struct, encoding=encoding, backend=backend)
+            self.backend = plan.backend
+            # like in ``StructPlan.evaluate``, the top of a struct is not chunked
+            root = _plan.copy_node(plan.root, type(plan.root))
+            root.key = name
+            root.start = root.end = root.literal = None
+            roots.append(root)
+        # the results are the fields of a dictionary holding the structs
+        self.root = _Group((_plan._Struct(None, tuple(roots)),))
+
+    def parse(self, text, encoding=DEFAULT_ENCODING):
+        """Returns the results of the structs by name, parsing the text once"""
+        plan, text = self.prepare(text, encoding)
+        if plan is None:
+            return dict((name, None) for name in self.structs)
+        return plan.root.evaluate(text, 0, len(text))[0]
+
+    def prepare(self, text, encoding=DEFAULT_ENCODING):
+        """See ``StructPlan.prepare``"""
+        if isinstance(text, (list, tuple)):
+            text = _plan._join(text)
+        if isinstance(text, _plan.BINARY_TYPES):
+            if self.encoding is None:
+                return compile(self.structs, encoding, self.backend), text
+            return self, text
+        if isinstance(text, six.string_types):
+            if self.encoding is not None:
+                text = text.encode(self.encoding)
+            return self, text
+        return None, text
+
+
+class _Group(object):
+    """
+    Dictionaries of several structs sharing their chunks, evaluated together.
+    ``evaluate`` returns the values of the dictionaries, in their order.
+    """
+
+    __slots__ = ("key", "nodes", "fields", "layouts", "inner")
+
+    def __init__(self, nodes):
+        self.key = nodes[0].key
+        self.nodes = nodes
+        fields = []
+        leaves = {}
+        groups = collections.OrderedDict()
+        layouts = []
+        for node in nodes:
+            layout = []
+            for field in node.fields:
+                if isinstance(field, _plan._Struct) and not field.columnar:
+                    members = groups.setdefault(_boundaries(field), [])
+                    layout.append((field.key, _boundaries(field), len(members)))
+                    members.append(field)
+                    continue
+                key = _leaf_key(field)
+                if key not in leaves:
+                    leaves[key] = len(fields)
+                    fields.append(field)
+                layout.append((field.key, leaves[key], None))
+            layouts.append(layout)
+
+        # the merged dictionaries follow the leaves
+        positions = {}
+        for boundaries, members in six.iteritems(groups):
+            positions[boundaries] = len(fields)
+            fields.append(_Group(tuple(members)))
+        # the (key, position, member) of the values of each dictionary, the
+        # member being the index of the dictionary in its group, if any
+        self.layouts = tuple(
+            tuple(
+                (key, position if member is None else positions[position], member)
+                for key, position, member in layout
+            )
+            for layout in layouts
+        )
+        self.fields = tuple(fields)
+        self.inner = _plan._Struct(None, self.fields)
+
+    def evaluate(self, text, pos=0, endpos=None):
+        if endpos is None:
+            endpos = len(text)
+        node = self.nodes[0]
+        if node.start is None:
+            return self.evaluate_fields(text, pos, endpos)
+        spans = node.spans(text, pos, endpos)
+        if spans is None:
+            return (None,) * len(self.nodes)
+        if node.is_list:
+            chunks = [self.evaluate_fields(text, start, end) for start, end in spans]
+            return tuple(
+                [chunk[member] for chunk in chunks] for member in range(len(self.nodes))
+            )
+        start, end = spans[0]
+        return self.evaluate_fields(text, start, end)
+
+    def evaluate_fields(self, text, pos, endpos):
+        values = self.inner.evaluate_values(text, pos, endpos)
+        results = []
+        for layout in self.layouts:
+            # a key repeated in the struct is parsed as its last occurrence
+            parsed = {}
+            for key, position, member in layout:
+                value = values[position]
+                parsed[key] = value if member is None else value[member]
+            results.append(parsed)
+        return tuple(results)
+
+
+def _boundaries(node):
+    # dictionaries can share their chunks when they are chunked by the same
+    # regexes, or not chunked at all, and are both lists or not
+    return (_regex_key(node.start), _regex_key(node.end), node.is_list)
+
+
+def _regex_key(boundary):
+    if boundary is None:
+        return None
+    regex = boundary.regex
+    pattern = getattr(regex, "pattern", None)
+    if pattern is None:
+        return id(regex)
+    return (type(regex), pattern, getattr(regex, "flags", 0))
+
+
+def _leaf_key(field):
+    # leaves of the same module and value extract the same value
+    if not isinstance(field, _plan._Leaf):
+        return id(field)
+    return (field.module, field.key, _plan._fingerprint(field.value))
+
+
+def compile(structs, encoding=None, backend=None):
+    """Returns the ``MultiPlan`` of the structs, reusing a cached one if any"""
+    backend = backends.get(backend).name
+    return cache.plans.get(
+        (MultiPlan, _plan._fingerprint(structs), encoding, backend),
+        lambda: MultiPlan(structs, encoding=encoding, backend=backend),
+    )
@@ -0,0 +1,301 @@
+import collections
+import multiprocessing
+
+from . import plan as _plan
+from .constants import DEFAULT_ENCODING
+
+try:
+    from concurrent import futures
+except ImportError:  # python 2 without the 'futures' backport
+    futures = None
+
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_MIN_CHUNKS = 64
+DEFAULT_MIN_SIZE = 1024 * 1024
+
+# plan of the struct shipped to a worker process when it started
+_worker_plan = None
+
+
+def parse_many(
+    texts,
+    struct,
+    workers=None,
+    executor="process",
+    ordered=True,
+    batch_size=DEFAULT_BATCH_SIZE,
+    encoding=DEFAULT_ENCODING,
+):
+    """
+    Parses many texts with the same struct in a pool of workers, see
+    ``map_batches``. The results are yielded in the order of ``texts``, or
+    as ``(index, result)`` pairs as soon as they are ready if ``ordered`` is
+    False. The exception raised while parsing a text is yielded in place of
+    its result, the other texts are parsed anyway.
+    """
+    if futures is None:
+        raise ImportError("parse_many requires the 'futures' package")
+    return map_batches(
+        _parse_text,
+        texts,
+        struct,
+        workers=workers,
+        executor=executor,
+        ordered=ordered,
+        batch_size=batch_size,
+        args=(encoding,),
+    )
+
+
+def map_batches(
+    function,
+    items,
+    struct,
+    workers=None,
+    executor="process",
+    ordered=True,
+    batch_size=DEFAULT_BATCH_SIZE,
+    args=(),
+    failed=None,
+):
+    """
+    Calls ``function(item, plan, *args)`` for each item in a pool of
+    workers, ``plan`` being the ``StructPlan`` of the struct, and yields the
+    results. ``executor`` is either 'process', 'thread' or an existing
+    ``concurrent.futures`` executor. The worker processes started here
+    compile the struct once, when they start. ``function`` must be a
+    function of a module for process pools.
+
+    The items are sent to the workers in batches of ``batch_size``, and only
+    a few batches are in flight at any time so ``items`` can be a lazy
+    iterable. The results are yielded in the order of ``items``, or as
+    ``(index, result)`` pairs as soon as they are ready if ``ordered`` is
+    False. The exception raised by ``function`` is yielded in place of its
+    result. When a whole batch fails, e.g. its results could not be sent
+    back, ``failed(item, exception)`` gives the result of each of its
+    items, the exception itself when ``failed`` is None.
+    """
+    if futures is None:
+        raise ImportError("map_batches requires the 'futures' package")
+    if batch_size < 1:
+        raise ValueError("batch_size must be greater than 0")
+
+    # a bad struct fails here rather than in every worker
+    compiled = _plan.compile(struct)
+    workers = workers or multiprocessing.cpu_count()
+    if executor == "process":
+        # the struct is compiled once per worker, when the worker starts
+        pool = futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(struct,)
+        )
+        own_pool = True
+        payload = None
+    else:
+        pool, own_pool = _pool(executor, workers)
+        # the workers of a pool we did not start compile the struct the first
+        # time they get it and then reuse their cached plan
+        payload = compiled if own_pool else struct
+
+    def submit(batch):
+        return pool.submit(_map_batch, function, batch, payload, args)
+
+    results = _ordered if ordered else _unordered
+    return _run(
+        results(_batches(items, batch_size), submit, workers * 2, failed),
+        pool,
+        own_pool,
+    )
+
+
+def parse_parallel(
+    text,
+    struct,
+    workers=None,
+    executor="process",
+    min_chunks=DEFAULT_MIN_CHUNKS,
+    min_size=DEFAULT_MIN_SIZE,
+    encoding=DEFAULT_ENCODING,
+    backend=None,
+):
+    """
+    Parses a single text, spreading the chunks of the lists at the top of
+    the struct over a pool of workers when a list has at least
+    ``min_chunks`` chunks spanning at least ``min_size`` characters. The
+    result is the same as the one of ``parse``, the regexes being compiled
+    with the regex ``backend`` in the workers too.
+
+    Starting a process pool is expensive, an existing executor can be given
+    to parse many texts.
+    """
+    if futures is None:
+        raise ImportError("parse_parallel requires the 'futures' package")
+    plan, text = _plan.compile(struct, backend=backend).prepare(text, encoding)
+    if plan is None:
+        return None
+
+    workers = workers or multiprocessing.cpu_count()
+    pool, own_pool = _pool(executor, workers)
+    try:
+        map_chunks = _chunk_mapper(plan, pool, workers, min_chunks, min_size)
+        return plan.root.evaluate_fields(text, 0, len(text), map_chunks)
+    finally:
+        if own_pool:
+            pool.shutdown(wait=True)
+
+
+def _pool(executor, workers):
+    if executor == "process":
+        return futures.ProcessPoolExecutor(max_workers=workers), True
+    if executor == "thread":
+        return futures.ThreadPoolExecutor(max_workers=workers), True
+    if isinstance(executor, futures.Executor):
+        return executor, False
+    raise ValueError(
+        "executor must be 'process', 'thread' or a concurrent.futures executor"
+    )
+
+
+def _chunk_mapper(plan, pool, workers, min_chunks, min_size):
+    shared_memory = isinstance(pool, futures.ThreadPoolExecutor)
+
+    # the workers find the lists at the top of the struct by their position
+    positions = dict((id(field), i) for i, field in enumerate(plan.root.fields))
+
+    def map_chunks(node, text, spans):
+        index = positions.get(id(node))
+        if (
+            index is None
+            or len(spans) < min_chunks
+            or spans[-1][1] - spans[0][0] < min_size
+        ):
+            return [node.evaluate_fields(text, start, end) for start, end in spans]
+
+        # a few batches per worker balance the load without sending every
+        # chunk on its own
+        size = max(1, -(-len(spans) // (workers * 4)))
+        submitted = []
+        for first in range(0, len(spans), size):
+            batch = spans[first : first + size]
+            if shared_memory:
+                submitted.append(pool.submit(_parse_spans, node, text, batch))
+            else:
+                chunks = [text[start:end] for start, end in batch]
+                submitted.append(
+                    pool.submit(
+                        _parse_chunks,
+                        plan.struct,
+                        plan.encoding,
+                        plan.backend,
+                        index,
+                        chunks,
+                    )
+                )
+
+        results = []
+        for future in submitted:
+            results.extend(future.result())
+        return results
+
+    return map_chunks
+
+
+def _parse_spans(node, text, spans):
+    return [node.evaluate_fields(text, start, end) for start, end in spans]
+
+
+def _parse_chunks(struct, encoding, backend, index, chunks):
+    # the backend is given by name, the default one of the worker may differ
+    node = _plan.compile(struct, encoding, backend).root.fields[index]
+    return [node.evaluate_fields(chunk, 0, len(chunk)) for chunk in chunks]
+
+
+def _run(results, pool, own_pool):
+    try:
+        for result in results:
+            yield result
+    finally:
+        if own_pool:
+            pool.shutdown(wait=True)
+
+
+def _ordered(batches, submit, window, failed=None):
+    pending = collections.deque()
+    for start, batch in batches:
+        pending.append((batch, submit(batch)))
+        if len(pending) >= window:
+            batch, future = pending.popleft()
+            for result in _batch_results(batch, future, failed):
+                yield result
+    while pending:
+        batch, future = pending.popleft()
+        for result in _batch_results(batch, future, failed):
+            yield result
+
+
+def _unordered(batches, submit, window, failed=None):
+    pending = {}
+    for start, batch in batches:
+        pending[submit(batch)] = (start, batch)
+        if len(pending) >= window:
+            for result in _completed(pending, futures.FIRST_COMPLETED, failed):
+                yield result
+    while pending:
+        for result in _completed(pending, futures.FIRST_COMPLETED, failed):
+            yield result
+
+
+def _completed(pending, return_when, failed=None):
+    done, _ = futures.wait(list(pending), return_when=return_when)
+    for future in done:
+        start, batch = pending.pop(future)
+        for offset, result in enumerate(_batch_results(batch, future, failed)):
+            yield start + offset, result
+
+
+def _batch_results(batch, future, failed=None):
+    try:
+        return future.result()
+    except Exception as e:
+        # the whole batch failed, e.g. its results could not be sent back
+        if failed is None:
+            return [e] * len(batch)
+        return [failed(item, e) for item in batch]
+
+
+def _batches(texts, batch_size):
+    batch = []
+    start = 0
+    for text in texts:
+        batch.append(text)
+        if len(batch) >= batch_size:
+            yield start, batch
+            start += len(batch)
+            batch = []
+    if len(batch) > 0:
+        yield start, batch
+
+
+def _init_worker(struct):
+    global _worker_plan
+    _worker_plan = _plan.compile(struct)
+
+
+def _map_batch(function, items, struct, args):
+    if struct is None:
+        plan = _worker_plan
+    elif isinstance(struct, _plan.StructPlan):
+        plan = struct
+    else:
+        plan = _plan.compile(struct)
+
+    results = []
+    for item in items:
+        try:
+            results.append(function(item, plan, *args))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _parse_text(text, plan, encoding):
+    return plan.parse(text, encoding)
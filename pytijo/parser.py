@@ -1,147 +1,205 @@
-import re
-import six
-import importlib
-from .constants import (
-    KEYWORD_ID,
-    KEYWORD_START,
-    KEYWORD_END,
-    KEYWORD_CHAR,
-    MODULE_CHAR,
-    CORE_MODULE_PACKAGE,
-    DEFAULT_MODULE_NAME,
+import sys
+from . import plan as _plan
+from . import multi as _multi
+from . import parallel as _parallel
+from . import validation as _validation
+from .constants import DEFAULT_ENCODING
+from .plan import (  # noqa: F401
+    StructPlan,
+    ParseTimeout,
+    compile_regex as _compile_regex,
+    load_module as _load_module,
 )
 
+if sys.version_info >= (3, 6):
+    from .aio import parse_async, parse_stream_async  # noqa: F401
+
+
+def parse(
+    text,
+    struct,
+    encoding=DEFAULT_ENCODING,
+    backend=None,
+    timeout=None,
+    index=False,
+    lazy=False,
+    output="dict",
+    cache=None,
+):
+    """
+    Parses the text with the struct. The text can be a string, a list of
+    lines, or bytes, bytearray, memoryview and mmap objects holding text in
+    ``encoding``. Binary inputs are parsed without being decoded, only the
+    extracted values are.
+
+    ``backend`` is the name of the regex engine to use, e.g. 're2' to match
+    hostile inputs in linear time, see ``pytijo.backends``. A parse taking
+    more than ``timeout`` seconds raises ``ParseTimeout``.
+
+    With ``index`` the keys whose regex starts with a literal are only
+    matched where the literal is in the text, see ``pytijo.index``. A
+    ``TextIndex`` can be given instead to share it between several parses
+    of the same text.
+
+    With ``lazy`` the result is a read only mapping whose keys, and the items
+    of its lists, are only parsed when they are accessed. It keeps the text,
+    ``materialize()`` returns the plain dictionary ``parse`` returns
+    otherwise. Lazy results cannot have a ``timeout``.
+
+    With the 'columnar' ``output``, the lists of dictionaries are returned
+    as ``columnar.Columns`` holding a column per key, NumPy arrays for the
+    numbers when NumPy is installed. The items of nested lists are stored
+    in the column of their list with an ``offsets`` array.
+
+    ``cache`` is a ``cache.ResultCache`` the results are looked up in first,
+    so parsing the same text with the same struct again is a lookup. Lazy
+    and columnar results are not cached.
+    """
+    plan = compile(struct, backend=backend)
+
+    def parse_text():
+        return plan.parse(
+            text, encoding, timeout=timeout, index=index, lazy=lazy, output=output
+        )
 
-def parse(text, struct):
-    if isinstance(text, (list, tuple)):
-        text = "\n".join(text)
-    if isinstance(text, six.string_types):
-        return parse_struct(text, struct)
-    return None
+    if cache is None or lazy or output != _plan.OUTPUT_DICT:
+        return parse_text()
+    return cache.get(text, struct, parse_text, encoding, plan.backend)
+
+
+def parse_multi(text, structs, encoding=DEFAULT_ENCODING, backend=None):
+    """
+    Parses the text with several structs at once, ``structs`` being a
+    dictionary of structs by name, and returns their results by name. The
+    lists of the structs chunked by the same regexes are chunked once, and
+    the keys of all the structs are extracted from each chunk together.
+    """
+    return _multi.compile(structs, backend=backend).parse(text, encoding)
+
+
+def parse_stream(lines, struct, key=None, encoding=DEFAULT_ENCODING):
+    """
+    Parses an iterable of lines, e.g. a file, yielding the items of a list of
+    the struct as soon as their chunk is read, so only one chunk is kept in
+    memory. ``key`` is the dotted path of the list, e.g. 'tables.flows', and
+    it can be omitted if the struct has a single list at the top.
+    """
+    return compile(struct).parse_stream(lines, key, encoding)
+
+
+def parse_to(
+    fp,
+    text,
+    struct,
+    format="json",
+    key=None,
+    encoding=DEFAULT_ENCODING,
+    default=None,
+):
+    """
+    Parses the text like ``parse`` and writes the result to the file ``fp``
+    as JSON while it is evaluated, only one chunk of the lists being kept in
+    memory at a time. The 'ndjson' ``format`` writes the items of the list
+    at ``key`` (see ``parse_stream``) one per line, and returns their
+    number. ``default`` is given to the JSON encoder for the values JSON
+    has no type for.
+    """
+    return compile(struct).write(fp, text, encoding, format, key, default)
+
+
+def parse_many(
+    texts,
+    struct,
+    workers=None,
+    executor="process",
+    ordered=True,
+    batch_size=_parallel.DEFAULT_BATCH_SIZE,
+    encoding=DEFAULT_ENCODING,
+):
+    """
+    Parses many texts with the same struct in a pool of ``workers`` processes
+    or threads, giving the same results as ``parse``. The results are yielded
+    in the order of ``texts``, or as ``(index, result)`` pairs when
+    ``ordered`` is False, with the exception raised by a text in place of
+    its result.
+    """
+    return _parallel.parse_many(
+        texts,
+        struct,
+        workers=workers,
+        executor=executor,
+        ordered=ordered,
+        batch_size=batch_size,
+        encoding=encoding,
+    )
+
+
+def parse_parallel(
+    text,
+    struct,
+    workers=None,
+    executor="process",
+    min_chunks=_parallel.DEFAULT_MIN_CHUNKS,
+    min_size=_parallel.DEFAULT_MIN_SIZE,
+    encoding=DEFAULT_ENCODING,
+    backend=None,
+):
+    """
+    Parses a single big text like ``parse``, parsing the chunks of the lists
+    at the top of the struct concurrently in a pool of ``workers`` once a
+    list has ``min_chunks`` chunks spanning ``min_size`` characters
+    """
+    return _parallel.parse_parallel(
+        text,
+        struct,
+        workers=workers,
+        executor=executor,
+        min_chunks=min_chunks,
+        min_size=min_size,
+        encoding=encoding,
+        backend=backend,
+    )
+
+
+def compile(struct, encoding=None, backend=None):
+    """
+    Validates the struct and returns a reusable ``StructPlan``. Plans are
+    cached, so compiling the same struct again is cheap. Plans compiled with
+    an ``encoding`` parse binary inputs, and their regexes are compiled with
+    the regex ``backend`` given.
+    """
+    return _plan.compile(struct, encoding, backend)
+
+
+def validate(struct, encoding=None, backend=None):
+    """
+    Checks the struct without parsing anything and returns a
+    ``validation.Report`` of its errors and warnings, e.g. regexes prone to
+    catastrophic backtracking, and of the number of regex scans of each
+    chunk of its lists. ``report.check()`` raises if there are errors.
+    """
+    return _validation.validate(struct, encoding, backend)
 
 
 def parse_struct(text, struct):
     if isinstance(text, (list, tuple)):
         text = "\n".join(text)
-
-    parsed = {}
-
-    for k, v in six.iteritems(struct):
-        if not isinstance(k, six.string_types) or len(k) <= 0:
-            continue
-
-        k = k.strip().lower()
-        module_index = k.find(MODULE_CHAR)
-
-        # Get module name
-        module_name = None
-        if module_index > -1:
-            module_name = k[module_index + 1 :]
-            k = k[:module_index]
-
-        # Load parser module
-        parser_module = _load_module(module_name)
-
-        # Get keyword
-        keyword = None
-        if k.startswith(KEYWORD_CHAR):
-            keyword = k
-            k = k[1:]
-
-        # if it is such a key name without module check if we need to keep parsing inside
-        if (module_name is None or len(module_name) == 0) and (
-            keyword is None or len(keyword) == 0
-        ):
-            return_as_list = False
-            if (
-                isinstance(v, (list, tuple))
-                and not isinstance(v, six.string_types)
-                and len(v) > 0
-                and isinstance(v[0], dict)
-            ):
-                v = v[0]
-                return_as_list = True
-            if isinstance(v, dict):
-                parsed[k] = _parse_dict(v, text, return_list=return_as_list)
-                continue
-
-        if keyword not in (KEYWORD_START, KEYWORD_END):
-            parsed[k] = parser_module.parse(text, k, v)
-
-    return parsed
-
-
-def _load_module(module_name=DEFAULT_MODULE_NAME):
-    # TODO: Load module from other packages
-    if module_name is None or len(module_name) == 0:
-        module_name = DEFAULT_MODULE_NAME
-    return importlib.import_module("{}.{}".format(CORE_MODULE_PACKAGE, module_name))
+    return compile(struct).evaluate(text)
 
 
 def _parse_dict(value, text, return_list=False):
-    if KEYWORD_START in value or KEYWORD_ID in value:
-        chunks = _chunk_lines(text, value)
-        if chunks is not None and len(chunks) > 0:
-            if return_list:
-                return [parse_struct(chunk, value) for chunk in chunks]
-            return parse_struct(chunks[0], value)
-
-        return None
-    return parse_struct(text, value)
+    if isinstance(text, (list, tuple)):
+        text = "\n".join(text)
+    return _plan.compile_node(value, is_list=return_list).evaluate(text)
 
 
 def _chunk_lines(text, struct):
-    if KEYWORD_ID not in struct and KEYWORD_START not in struct:
-        raise KeyError(
-            "'{}' or '{}' key is required in a list containing a dictionary".format(
-                KEYWORD_ID, KEYWORD_START
-            )
-        )
+    spans = _chunk_spans(text, struct)
+    if spans is None:
+        return None
+    return [text[start:end] for start, end in spans]
 
-    # TODO make this more intelligent. For example, make start like
-    # '#start': {'regex': '<the-regex>',skip: true, group:1} that will allow to customize
-    # thinks like which group to use and if the text matched should be included or not
-    start = struct[KEYWORD_START] if KEYWORD_START in struct else struct[KEYWORD_ID]
-    start_regex = _compile_regex(KEYWORD_ID, start)
-
-    end = struct[KEYWORD_END] if KEYWORD_END in struct else None
-    end_regex = _compile_regex(KEYWORD_END, end) if end is not None else None
-
-    chunks = []
-    if not end_regex:
-        start_position = -1
-        for match in start_regex.finditer(text):
-            if start_position < 0:
-                start_position = match.span()[0]
-                continue
-            chunk = text[start_position : match.span()[0]]
-            if len(chunk) > 0:
-                chunks.append(chunk)
-            start_position = match.span()[0]
-        if start_position >= 0 and len(text) > start_position:
-            chunk = text[start_position : len(text)]
-            chunks.append(chunk)
-    else:
-        while len(text) > 0:
-            start_match = start_regex.search(text)
-            end_match = end_regex.search(text)
-            if not start_match or not end_match:
-                break
-            chunk = text[start_match.span()[0] : end_match.span()[1]]
-            text = text[
-                end_match.span()[0] - 1
-                if start_match.span()[1] < end_match.span()[0]
-                else start_match.span()[1] + 1 :
-            ]
-            if len(chunk) > 0:
-                chunks.append(chunk)
-
-    return chunks if len(chunks) > 0 else None
-
-
-def _compile_regex(key, regex):
-    if not isinstance(regex, six.string_types):
-        raise TypeError(
-            "The value at key '{}' must be a regular expression string".format(key)
-        )
-    return re.compile(regex, re.MULTILINE)
+
+def _chunk_spans(text, struct, pos=0, endpos=None):
+    start_regex, end_regex = _plan.compile_boundaries(struct)
+    return _plan.chunk_spans(text, start_regex, end_regex, pos, endpos)
@@ -0,0 +1,677 @@
+import re
+import six
+import copy
+import mmap
+import timeit
+import threading
+import collections
+from . import cache
+from . import backends
+from . import stream
+from . import serialize
+from . import registry
+from .index import TextIndex, contains
+from .lazy import LazyDict
+from . import columnar as _columnar
+from .analysis import needs_context, required_literal
+from .constants import (
+    KEYWORD_ID,
+    KEYWORD_START,
+    KEYWORD_END,
+    KEYWORD_COLUMNAR,
+    KEYWORD_CHAR,
+    MODULE_CHAR,
+    DEFAULT_MODULE_NAME,
+    DEFAULT_ENCODING,
+)
+
+# a compiled '#id', '#start' or '#end' regex
+Boundary = collections.namedtuple("Boundary", ["regex", "contextual"])
+
+# inputs parsed with byte patterns, the text types of python 2 excluded
+BINARY_TYPES = tuple(
+    t
+    for t in (six.binary_type, bytearray, memoryview, mmap.mmap)
+    if not issubclass(t, six.string_types)
+)
+
+# the ``instrument.Profiler`` active in the current thread, if any, as
+# ``profiling.profiler``. It is looked up once per parse, the plans are
+# evaluated as usual when there is none
+profiling = threading.local()
+
+OUTPUT_DICT = "dict"
+OUTPUT_COLUMNAR = "columnar"
+OUTPUTS = (OUTPUT_DICT, OUTPUT_COLUMNAR)
+
+
+class ParseTimeout(RuntimeError):
+    """Raised when a parse takes longer than the time it was given"""
+
+
+class StructPlan(object):
+    """
+    A struct validated and compiled once. The plan keeps the precompiled
+    patterns and resolved modules of every key so ``parse`` only does the
+    matching work.
+
+    A plan compiled with an ``encoding`` applies byte patterns to bytes,
+    bytearray, memoryview or mmap inputs, and only the extracted values are
+    decoded.
+
+    The regexes are compiled with the regex ``backend`` of the given name,
+    the default one when no name is given.
+    """
+
+    __slots__ = ("struct", "root", "encoding", "backend")
+
+    def __init__(self, struct, encoding=None, backend=None):
+        if not isinstance(struct, dict):
+            raise TypeError("The struct must be a dictionary")
+        # the plans are cached by the content of the struct, a struct changed
+        # by the caller afterwards must not change the plan
+        self.struct = copy.deepcopy(struct)
+        self.encoding = encoding
+        self.backend = backends.get(backend).name
+        self.root = compile_node(struct, encoding=encoding, backend=self.backend)
+
+    def parse(
+        self,
+        text,
+        encoding=DEFAULT_ENCODING,
+        map_chunks=None,
+        timeout=None,
+        index=False,
+        lazy=False,
+        output="dict",
+    ):
+        """
+        Parses the text, raising ``ParseTimeout`` if it takes more than
+        ``timeout`` seconds. With ``index`` the keys whose regex starts with
+        a literal are looked up through a ``TextIndex`` of the text. With
+        ``lazy`` a ``LazyDict`` evaluating the keys on access is returned.
+        With the 'columnar' ``output`` the lists are returned as ``Columns``.
+        """
+        plan, text = self.prepare(text, encoding)
+        if plan is None:
+            return None
+        return plan.evaluate(
+            text, 0, len(text), map_chunks, timeout, index, lazy, output
+        )
+
+    def evaluate(
+        self,
+        text,
+        pos=0,
+        endpos=None,
+        map_chunks=None,
+        timeout=None,
+        index=False,
+        lazy=False,
+        output="dict",
+    ):
+        """
+        Evaluates the struct over the span ``pos:endpos`` of a prepared text.
+        ``index`` is either a flag or the ``TextIndex`` of the text.
+        """
+        if output not in OUTPUTS:
+            raise ValueError("output must be one of {}".format(", ".join(OUTPUTS)))
+        if lazy and timeout is not None:
+            # the keys of lazy results are parsed long after the call, when
+            # they are accessed
+            raise ValueError("lazy results cannot have a timeout")
+        if endpos is None:
+            endpos = len(text)
+        profiler = getattr(profiling, "profiler", None)
+        root = self.root if profiler is None else profiler.instrument(self.root)
+        if output == OUTPUT_COLUMNAR:
+            if lazy:
+                raise ValueError("lazy results cannot be columnar")
+            arrays = "array" if _columnar.numpy is None else "numpy"
+            root = _extend(root, _ColumnarOutput, "output", arrays, kinds=(_Struct,))
+        if index is True:
+            index = TextIndex(text)
+        if index:
+            root = _extend(root, _Indexed, "index", index, kinds=(_Leaf,))
+        if timeout is not None:
+            root = _extend(root, _Timed, "deadline", Deadline(timeout))
+        if lazy:
+            return LazyDict(root, text, pos, endpos)
+        return root.evaluate_fields(text, pos, endpos, map_chunks)
+
+    def prepare(self, text, encoding=DEFAULT_ENCODING):
+        """
+        Returns the plan able to parse the text, the binary one for binary
+        inputs, and the text as that plan expects it
+        """
+        if isinstance(text, (list, tuple)):
+            text = _join(text)
+        if isinstance(text, BINARY_TYPES):
+            if self.encoding is None:
+                return self.binary(encoding), text
+            return self, text
+        if isinstance(text, six.string_types):
+            if self.encoding is not None:
+                text = text.encode(self.encoding)
+            return self, text
+        return None, text
+
+    def binary(self, encoding=DEFAULT_ENCODING):
+        """Returns the plan of the same struct for inputs in ``encoding``"""
+        if self.encoding == encoding:
+            return self
+        return compile(self.struct, encoding=encoding, backend=self.backend)
+
+    def parse_stream(self, lines, key=None, encoding=DEFAULT_ENCODING):
+        return stream.parse_stream(lines, self, key, encoding)
+
+    def write(
+        self,
+        fp,
+        text,
+        encoding=DEFAULT_ENCODING,
+        format=serialize.FORMAT_JSON,
+        key=None,
+        default=None,
+    ):
+        """
+        Writes the result of the parse of the text to ``fp`` as it is
+        evaluated, see ``serialize.Writer``. The 'ndjson' ``format`` writes
+        the items of the list at ``key`` and returns their number.
+        """
+        if format not in serialize.FORMATS:
+            raise ValueError(
+                "format must be one of {}".format(", ".join(serialize.FORMATS))
+            )
+        writer = serialize.Writer(fp, default)
+        plan, text = self.prepare(text, encoding)
+        if format == serialize.FORMAT_NDJSON:
+            if plan is None:
+                return 0
+            return writer.write_ndjson(plan.root, text, 0, len(text), key)
+        if plan is None:
+            fp.write("null")
+        else:
+            writer.write_json(plan.root, text, 0, len(text))
+
+
+class _Leaf(object):
+    """A key whose value is extracted by a parser module"""
+
+    __slots__ = ("key", "module", "value", "spec", "encoding")
+
+    def __init__(self, key, module, value, encoding=None, backend=None):
+        self.key = key
+        self.module = module
+        self.value = value
+        self.encoding = encoding
+        # modules that are not able to precompile their values are called
+        # through their plain ``parse`` function
+        compiler = getattr(module, "compile", None)
+        options = {}
+        if encoding is not None:
+            options["encoding"] = encoding
+        if backend is not None:
+            options["backend"] = backend
+        self.spec = None if compiler is None else compiler(key, value, **options)
+
+    def evaluate(self, text, pos=0, endpos=None):
+        return self.extract(text, pos, endpos)
+
+    def extract(self, text, pos=0, endpos=None, index=None):
+        """
+        Extracts the value from the span ``pos:endpos``, looking it up
+        through the ``TextIndex`` of the text when one is given and the
+        module is able to
+        """
+        if self.spec is not None:
+            lookup = None if index is None else _indexed_lookup(self.module)
+            if lookup is not None:
+                return lookup(text, self.spec, index, pos, endpos)
+            return self.module.extract(text, self.spec, pos, endpos)
+        text = _slice(text, pos, endpos)
+        if self.encoding is not None:
+            text = six.binary_type(text).decode(self.encoding, "replace")
+        return self.module.parse(text, self.key, self.value)
+
+
+class _Struct(object):
+    """
+    A dictionary of the struct, optionally chunked by '#id'/'#start'. It is
+    evaluated over the span ``pos:endpos`` of the text, the chunks being
+    spans of the same text too. The items of a ``columnar`` list are
+    returned as ``Columns``.
+    """
+
+    __slots__ = (
+        "key",
+        "fields",
+        "keys",
+        "start",
+        "end",
+        "is_list",
+        "columnar",
+        "batches",
+        "literal",
+    )
+
+    def __init__(
+        self, key, fields, start=None, end=None, is_list=False, columnar=False
+    ):
+        self.key = key
+        self.fields = fields
+        self.keys = tuple(field.key for field in fields)
+        self.start = start
+        self.end = end
+        self.is_list = is_list
+        self.columnar = columnar
+        self.batches = _compile_batches(fields)
+        # there are no chunks in a span without the literal of '#id'/'#start'
+        self.literal = None if start is None else required_literal(start.regex)
+
+    def evaluate(self, text, pos=0, endpos=None, map_chunks=None):
+        """
+        ``map_chunks(node, text, spans)`` can take over the evaluation of the
+        chunks of the lists, e.g. to spread them over several workers. It is
+        given to the dictionaries inside this one, not to the list items.
+        """
+        if endpos is None:
+            endpos = len(text)
+        if self.start is None:
+            return self.evaluate_fields(text, pos, endpos, map_chunks)
+        spans = self.spans(text, pos, endpos)
+        if spans is None:
+            return None
+        if self.is_list:
+            if self.columnar:
+                return _columnar.evaluate_columns(self, text, spans)
+            if map_chunks is not None:
+                return map_chunks(self, text, spans)
+            return [self.evaluate_fields(text, start, end) for start, end in spans]
+        start, end = spans[0]
+        return self.evaluate_fields(text, start, end, map_chunks)
+
+    def spans(self, text, pos, endpos):
+        """Returns the spans of the chunks between ``pos`` and ``endpos``, if any"""
+        if self.literal is not None and not contains(text, self.literal, pos, endpos):
+            return None
+        return chunk_spans(text, self.start, self.end, pos, endpos)
+
+    def evaluate_fields(self, text, pos, endpos, map_chunks=None):
+        batched = self.extract_batches(text, pos, endpos)
+
+        # a key repeated in the struct is parsed as its last occurrence
+        parsed = {}
+        for position, field in enumerate(self.fields):
+            if position in batched:
+                parsed[field.key] = batched[position]
+            elif map_chunks is not None and isinstance(field, _Struct):
+                parsed[field.key] = field.evaluate(text, pos, endpos, map_chunks)
+            else:
+                parsed[field.key] = field.evaluate(text, pos, endpos)
+        return parsed
+
+    def extract_batches(self, text, pos, endpos):
+        """Returns the values of the leaves extracted in batches by position"""
+        batched = {}
+        for module, multi, specs, positions in self.batches:
+            results = module.extract_many(text, multi, specs, pos, endpos)
+            batched.update(zip(positions, results))
+        return batched
+
+    def evaluate_values(self, text, pos, endpos, map_chunks=None, structs=True):
+        """
+        Returns the values of the fields, in the order of the fields. The
+        dictionaries inside this one are None unless ``structs`` is True.
+        """
+        batched = self.extract_batches(text, pos, endpos)
+
+        values = []
+        for position, field in enumerate(self.fields):
+            if position in batched:
+                values.append(batched[position])
+            elif isinstance(field, _Struct):
+                if not structs:
+                    values.append(None)
+                elif map_chunks is not None:
+                    values.append(field.evaluate(text, pos, endpos, map_chunks))
+                else:
+                    values.append(field.evaluate(text, pos, endpos))
+            else:
+                values.append(field.evaluate(text, pos, endpos))
+        return values
+
+
+def _compile_batches(fields):
+    # sibling leaves of the same module are extracted in a single scan when
+    # the module knows how to combine their specs
+    leaves = collections.OrderedDict()
+    for position, field in enumerate(fields):
+        if isinstance(field, _Leaf) and field.spec is not None:
+            if getattr(field.module, "compile_many", None) is not None:
+                leaves.setdefault(field.module, []).append(position)
+
+    batches = []
+    for module, positions in six.iteritems(leaves):
+        specs = tuple(fields[position].spec for position in positions)
+        multi = module.compile_many(specs)
+        if multi is not None:
+            members = tuple(positions[member] for member in multi.members)
+            batches.append((module, multi, specs, members))
+    return tuple(batches)
+
+
+class Deadline(object):
+    """The time left to a parse, checked before evaluating every key"""
+
+    __slots__ = ("timeout", "expires", "clock")
+
+    def __init__(self, timeout, clock=timeit.default_timer):
+        self.timeout = timeout
+        self.clock = clock
+        self.expires = clock() + timeout
+
+    def check(self):
+        if self.clock() > self.expires:
+            raise ParseTimeout(
+                "The parse took longer than {} seconds".format(self.timeout)
+            )
+
+
+class _Timed(object):
+    # mixed in the class of a node to check the deadline of the parse before
+    # the node, and each chunk of a list, is evaluated. A regex that is being
+    # matched is not interrupted, the parse stops after it.
+    __slots__ = ()
+
+    def evaluate(self, text, *args):
+        self.deadline.check()
+        return super(_Timed, self).evaluate(text, *args)
+
+    def evaluate_fields(self, text, *args):
+        self.deadline.check()
+        return super(_Timed, self).evaluate_fields(text, *args)
+
+    def evaluate_values(self, text, *args):
+        self.deadline.check()
+        return super(_Timed, self).evaluate_values(text, *args)
+
+
+class _ColumnarOutput(object):
+    # mixed in the class of the structs to return the lists they hold as
+    # ``Columns``, the lists and dictionaries of their items included
+    __slots__ = ()
+
+    def evaluate(self, text, pos=0, endpos=None, map_chunks=None):
+        if not self.is_list or self.start is None:
+            return super(_ColumnarOutput, self).evaluate(text, pos, endpos, map_chunks)
+        if endpos is None:
+            endpos = len(text)
+        spans = self.spans(text, pos, endpos)
+        if spans is None:
+            return None
+        return _columnar.evaluate_columns(
+            self, text, spans, nested=True, arrays=self.output
+        )
+
+
+class _Indexed(object):
+    # mixed in the class of a leaf to look up its value through the index of
+    # the text, when its module is able to
+    __slots__ = ()
+
+    def evaluate(self, text, pos=0, endpos=None):
+        return self.extract(text, pos, endpos, self.index)
+
+
+def _indexed_lookup(module):
+    return getattr(module, "extract_indexed", None)
+
+
+_extended_classes = {}
+
+
+def _extend(node, mixin, name, value, kinds=(_Leaf, _Struct)):
+    """
+    Returns a copy of the tree of nodes where the nodes of ``kinds`` have
+    ``mixin`` in their classes and hold ``value`` as ``name``. The nodes can
+    be extended copies already, e.g. the instrumented nodes of a profiler.
+    """
+    extend = isinstance(node, kinds)
+    if not extend and not isinstance(node, _Struct):
+        return node
+    cls = type(node)
+    target = cls
+    if extend:
+        target = _extended_classes.get((mixin, cls))
+        if target is None:
+            target = _extended_classes[(mixin, cls)] = type(
+                mixin.__name__.lstrip("_") + cls.__name__.lstrip("_"),
+                (mixin, cls),
+                {"__slots__": (name,)},
+            )
+    copy = copy_node(node, target)
+    if isinstance(node, _Struct):
+        copy.fields = tuple(
+            _extend(field, mixin, name, value, kinds) for field in node.fields
+        )
+    if extend:
+        setattr(copy, name, value)
+    return copy
+
+
+def copy_node(node, cls):
+    """Returns a node of class ``cls``, a subclass of the one of ``node``, equal to it"""
+    copy = cls.__new__(cls)
+    for klass in type(node).__mro__:
+        for slot in getattr(klass, "__slots__", ()):
+            setattr(copy, slot, getattr(node, slot))
+    return copy
+
+
+def compile(struct, encoding=None, backend=None):
+    """Returns the ``StructPlan`` of the struct, reusing a cached one if any"""
+    backend = backends.get(backend).name
+    return cache.plans.get(
+        (_fingerprint(struct), encoding, backend),
+        lambda: StructPlan(struct, encoding=encoding, backend=backend),
+    )
+
+
+def compile_node(struct, key=None, is_list=False, encoding=None, backend=None):
+    fields = []
+
+    for k, v in six.iteritems(struct):
+        if not isinstance(k, six.string_types) or len(k) <= 0:
+            continue
+
+        k = k.strip().lower()
+        module_index = k.find(MODULE_CHAR)
+
+        # Get module name
+        module_name = None
+        if module_index > -1:
+            module_name = k[module_index + 1 :]
+            k = k[:module_index]
+
+        # Load parser module
+        parser_module = load_module(module_name)
+
+        # Get keyword
+        keyword = None
+        if k.startswith(KEYWORD_CHAR):
+            keyword = k
+            k = k[1:]
+
+        # if it is such a key name without module check if we need to keep parsing inside
+        if (module_name is None or len(module_name) == 0) and (
+            keyword is None or len(keyword) == 0
+        ):
+            return_as_list = False
+            if (
+                isinstance(v, (list, tuple))
+                and not isinstance(v, six.string_types)
+                and len(v) > 0
+                and isinstance(v[0], dict)
+            ):
+                v = v[0]
+                return_as_list = True
+            if isinstance(v, dict):
+                fields.append(
+                    compile_node(
+                        v,
+                        key=k,
+                        is_list=return_as_list,
+                        encoding=encoding,
+                        backend=backend,
+                    )
+                )
+                continue
+
+        if keyword not in (KEYWORD_START, KEYWORD_END, KEYWORD_COLUMNAR):
+            fields.append(
+                _Leaf(k, parser_module, v, encoding=encoding, backend=backend)
+            )
+
+    start = end = None
+    if KEYWORD_START in struct or KEYWORD_ID in struct:
+        start, end = compile_boundaries(struct, encoding=encoding, backend=backend)
+    columnar = bool(struct.get(KEYWORD_COLUMNAR, False))
+    if columnar and not is_list:
+        raise ValueError(
+            "'{}' is only allowed in a dictionary of a list".format(KEYWORD_COLUMNAR)
+        )
+    return _Struct(
+        key,
+        tuple(fields),
+        start=start,
+        end=end,
+        is_list=is_list,
+        columnar=columnar,
+    )
+
+
+def compile_boundaries(struct, encoding=None, backend=None):
+    if KEYWORD_ID not in struct and KEYWORD_START not in struct:
+        raise KeyError(
+            "'{}' or '{}' key is required in a list containing a dictionary".format(
+                KEYWORD_ID, KEYWORD_START
+            )
+        )
+
+    # TODO make this more intelligent. For example, make start like
+    # '#start': {'regex': '<the-regex>',skip: true, group:1} that will allow to customize
+    # thinks like which group to use and if the text matched should be included or not
+    start = struct[KEYWORD_START] if KEYWORD_START in struct else struct[KEYWORD_ID]
+    start_regex = _compile_boundary(KEYWORD_ID, start, encoding, backend)
+
+    end = struct[KEYWORD_END] if KEYWORD_END in struct else None
+    end_regex = (
+        _compile_boundary(KEYWORD_END, end, encoding, backend)
+        if end is not None
+        else None
+    )
+    return start_regex, end_regex
+
+
+def compile_regex(key, regex, encoding=None, backend=None):
+    if not isinstance(regex, six.string_types):
+        raise TypeError(
+            "The value at key '{}' must be a regular expression string".format(key)
+        )
+    if encoding is not None:
+        regex = regex.encode(encoding)
+    return cache.compile_pattern(regex, re.MULTILINE, backend=backend)
+
+
+def _compile_boundary(key, regex, encoding=None, backend=None):
+    regex = compile_regex(key, regex, encoding, backend)
+    return Boundary(regex, needs_context(regex))
+
+
+def load_module(module_name=DEFAULT_MODULE_NAME):
+    return registry.get(module_name)
+
+
+def chunk_spans(text, start_regex, end_regex=None, pos=0, endpos=None):
+    """
+    Returns the ``(start, end)`` spans of the chunks found between ``pos``
+    and ``endpos`` of the text, or None if there are no chunks
+    """
+    if endpos is None:
+        endpos = len(text)
+    spans = []
+    if not end_regex:
+        start_position = -1
+        for start, _ in _finditer(start_regex, text, pos, endpos):
+            if start_position < 0:
+                start_position = start
+                continue
+            if start > start_position:
+                spans.append((start_position, start))
+            start_position = start
+        if start_position >= 0 and endpos > start_position:
+            spans.append((start_position, endpos))
+    else:
+        position = pos
+        while position < endpos:
+            start_match = _search(start_regex, text, position, endpos)
+            end_match = _search(end_regex, text, position, endpos)
+            if not start_match or not end_match:
+                break
+            if end_match[1] > start_match[0]:
+                spans.append((start_match[0], end_match[1]))
+            # keep looking from right before the end of the chunk, there could
+            # be another chunk starting there
+            next_position = (
+                end_match[0] - 1
+                if start_match[1] < end_match[0]
+                else start_match[1] + 1
+            )
+            position = max(next_position, position + 1)
+
+    return spans if len(spans) > 0 else None
+
+
+def _search(boundary, text, pos, endpos):
+    # the span of the first match of the regex as if the text was sliced at
+    # ``pos:endpos``, without copying the text when that makes no difference
+    if pos > 0 and boundary.contextual:
+        match = boundary.regex.search(text[pos:endpos])
+        return (match.start() + pos, match.end() + pos) if match else None
+    match = boundary.regex.search(text, pos, endpos)
+    return match.span() if match else None
+
+
+def _finditer(boundary, text, pos, endpos):
+    if pos > 0 and boundary.contextual:
+        for match in boundary.regex.finditer(text[pos:endpos]):
+            yield match.start() + pos, match.end() + pos
+    else:
+        for match in boundary.regex.finditer(text, pos, endpos):
+            yield match.span()
+
+
+def _join(lines):
+    if len(lines) > 0 and isinstance(lines[0], BINARY_TYPES):
+        return b"\n".join(lines)
+    return "\n".join(lines)
+
+
+def _slice(text, pos, endpos):
+    if pos == 0 and (endpos is None or endpos == len(text)):
+        return text
+    return text[pos:endpos]
+
+
+def _fingerprint(value):
+    # a hashable image of the struct, the order of the keys matters as it is
+    # the order of the keys in the parsed output
+    if isinstance(value, dict):
+        return (
+            dict,
+            tuple((k, _fingerprint(v)) for k, v in six.iteritems(value)),
+        )
+    if isinstance(value, (list, tuple)):
+        return (list, tuple(_fingerprint(v) for v in value))
+    return (type(value), value)
@@ -0,0 +1,170 @@
+"""
+The parser modules the keys of a struct are given to with ``key@module``.
+
+A module is any object, usually a python module, with:
+
+- ``parse(text, key, value)``, returning the value of the key in the text.
+
+It can also precompile the values it is given once per struct, and then be
+applied to spans of the whole text rather than to sliced strings:
+
+- ``compile(key, value, encoding=None, backend=None)``, returning the spec
+  of the value. ``encoding`` is given for structs applied to binary inputs,
+  ``backend`` is the name of the regex engine, see ``pytijo.backends``.
+- ``extract(text, spec, pos=0, endpos=None)``, returning the value of the
+  spec in the span ``pos:endpos`` of the text.
+
+And extract the values of several sibling keys in a single scan:
+
+- ``compile_many(specs)``, returning a combined spec or None.
+- ``extract_many(text, multi, specs, pos=0, endpos=None)``, returning the
+  values of the specs.
+
+And tell the profiler the scans ``extract`` does:
+
+- ``scans(text, spec, pos=0, endpos=None, index=None)``, returning the
+  number of scans of the span and the characters they go over, one scan
+  of the whole span being assumed otherwise.
+
+The modules of the 'pytijo.modules' package are found by their name.
+Modules of other packages are registered with ``register``, or declared in
+the 'pytijo.modules' entry point group of their distribution, the modules
+of the package taking precedence over the declared ones::
+
+    entry_points={"pytijo.modules": ["table = mypackage.table"]}
+"""
+
+import pkgutil
+import importlib
+import threading
+
+import six
+
+from . import cache
+from .constants import CORE_MODULE_PACKAGE, DEFAULT_MODULE_NAME
+
+ENTRY_POINT_GROUP = "pytijo.modules"
+
+# the modules resolved so far by name, each name is resolved once
+_modules = {}
+_lock = threading.Lock()
+_entry_points = None
+
+
+def register(name, module):
+    """
+    Makes a module available as ``key@name``, the names being case
+    insensitive like the keys of the structs. ``module`` is either the
+    module or the dotted name of the python module to import.
+    """
+    if not isinstance(module, six.string_types):
+        check(module)
+    with _lock:
+        _modules[_normalize(name)] = module
+
+
+def get(name=None):
+    """
+    Returns the module called ``name``, the default one if no name is given.
+    It raises ``ImportError`` if there is no such module.
+    """
+    name = _normalize(name) or DEFAULT_MODULE_NAME
+    module = _modules.get(name)
+    if module is None or isinstance(module, six.string_types):
+        module = _resolve(name, module)
+        with _lock:
+            _modules[name] = module
+    return module
+
+
+def preload(names=None):
+    """
+    Resolves the modules with the given names, all the known modules if no
+    name is given, e.g. when a worker starts so that its first parse does
+    not pay for the imports. It returns the names of the modules loaded.
+    """
+    if names is None:
+        names = available()
+    for name in names:
+        get(name)
+    return list(names)
+
+
+def available():
+    """Returns the names of the modules of the package, registered or declared"""
+    package = importlib.import_module(CORE_MODULE_PACKAGE)
+    names = set(name for _, name, _ in pkgutil.iter_modules(package.__path__))
+    names.update(_modules)
+    names.update(_discover())
+    return sorted(names)
+
+
+def check(module):
+    """Raises ``TypeError`` if the module does not follow the module protocol"""
+    if callable(getattr(module, "parse", None)):
+        return
+    if callable(getattr(module, "compile", None)) and callable(
+        getattr(module, "extract", None)
+    ):
+        return
+    raise TypeError(
+        "The module {!r} has neither a 'parse' function nor 'compile' and "
+        "'extract' ones".format(module)
+    )
+
+
+def clear():
+    """Forgets the registered and resolved modules, mostly for tests"""
+    global _entry_points
+    with _lock:
+        _modules.clear()
+        _entry_points = None
+
+
+def _resolve(name, path=None):
+    if path is not None:
+        module = cache.import_module(path)
+    else:
+        # the modules of the package come first, the entry points are only
+        # looked up for the other names
+        try:
+            module = cache.import_module("{}.{}".format(CORE_MODULE_PACKAGE, name))
+        except ImportError:
+            entry_point = _discover().get(name)
+            if entry_point is None:
+                raise
+            module = entry_point.load()
+    check(module)
+    return module
+
+
+def _discover():
+    # the entry points declared by the installed distributions, looked up
+    # once as scanning them is slow
+    global _entry_points
+    if _entry_points is None:
+        _entry_points = dict((_normalize(ep.name), ep) for ep in _iter_entry_points())
+    return _entry_points
+
+
+def _normalize(name):
+    # the keys of the structs, and so the module names they hold, are
+    # stripped and lowercased when the struct is compiled
+    return name.strip().lower() if name else name
+
+
+def _iter_entry_points():
+    try:
+        from importlib import metadata
+    except ImportError:
+        metadata = None
+    if metadata is not None:
+        entry_points = metadata.entry_points()
+        if hasattr(entry_points, "select"):
+            return entry_points.select(group=ENTRY_POINT_GROUP)
+        return entry_points.get(ENTRY_POINT_GROUP, ())
+    try:
+        import pkg_resources
+    except ImportError:
+        return ()
+    return pkg_resources.iter_entry_points(ENTRY_POINT_GROUP)
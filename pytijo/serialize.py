@@ -0,0 +1,112 @@
+import json
+import collections
+
+import six
+
+from . import stream as _stream
+
+FORMAT_JSON = "json"
+FORMAT_NDJSON = "ndjson"
+FORMATS = (FORMAT_JSON, FORMAT_NDJSON)
+
+
+class Writer(object):
+    """
+    Writes the result of a plan to a file as the struct is evaluated, rather
+    than building the whole result first. The values of the keys of a
+    dictionary are extracted together, but the items of its lists are
+    written one at a time, so only one chunk is parsed and kept in memory
+    at once.
+
+    The output is the one ``json.dumps`` gives for the result of ``parse``,
+    but for the ``columnar`` lists which are written as lists of items.
+    ``default`` is given to the encoder for the values JSON has no type
+    for, e.g. the timestamps of the keys typed as such.
+    """
+
+    def __init__(self, fp, default=None):
+        self.fp = fp
+        self._encode = json.JSONEncoder(default=default).encode
+
+    def write_json(self, root, text, pos, endpos):
+        """Writes the result as a single JSON document"""
+        self._write_fields(root, text, pos, endpos)
+
+    def write_ndjson(self, root, text, pos, endpos, key=None):
+        """
+        Writes the items of the list at ``key`` as JSON records, one per line,
+        and returns the number of records. ``key`` is the dotted path of the
+        list, e.g. 'tables.flows', and it can be omitted if the struct has a
+        single list at the top.
+        """
+        records = 0
+        path = _stream.list_path(root, key)
+        for node, start, end in _items(path, text, pos, endpos):
+            self._write_fields(node, text, start, end)
+            self.fp.write("\n")
+            records += 1
+        return records
+
+    def _write_fields(self, node, text, pos, endpos):
+        write = self.fp.write
+        # the dictionaries inside this one are written as they are evaluated
+        values = node.evaluate_values(text, pos, endpos, None, False)
+        write("{")
+        for count, (key, position) in enumerate(_positions(node)):
+            if count > 0:
+                write(", ")
+            write(self._encode(key))
+            write(": ")
+            field = node.fields[position]
+            if _is_struct(field):
+                self._write_struct(field, text, pos, endpos)
+            else:
+                write(self._encode(values[position]))
+        write("}")
+
+    def _write_struct(self, node, text, pos, endpos):
+        if node.start is None:
+            self._write_fields(node, text, pos, endpos)
+            return
+        spans = node.spans(text, pos, endpos)
+        if spans is None:
+            self.fp.write("null")
+        elif node.is_list:
+            self.fp.write("[")
+            for count, (start, end) in enumerate(spans):
+                if count > 0:
+                    self.fp.write(", ")
+                self._write_fields(node, text, start, end)
+            self.fp.write("]")
+        else:
+            self._write_fields(node, text, *spans[0])
+
+
+def _positions(node):
+    # a key repeated in the struct is parsed as its last occurrence, in the
+    # place of its first one like in the dictionary of the result
+    positions = collections.OrderedDict()
+    for position, field in enumerate(node.fields):
+        positions[field.key] = position
+    return six.iteritems(positions)
+
+
+def _items(path, text, pos, endpos):
+    # yields the node and span of the items of the last node of the path
+    node, rest = path[0], path[1:]
+    if node.start is None:
+        spans = [(pos, endpos)]
+    else:
+        spans = node.spans(text, pos, endpos) or []
+        if not node.is_list:
+            spans = spans[:1]
+    for start, end in spans:
+        if not rest:
+            yield node, start, end
+            continue
+        for item in _items(rest, text, start, end):
+            yield item
+
+
+def _is_struct(field):
+    return getattr(field, "fields", None) is not None
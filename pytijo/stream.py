@@ -0,0 +1,204 @@
+import six
+
+from .constants import KEYWORD_END, DEFAULT_ENCODING
+
+
+class BlockSplitter(object):
+    """
+    Splits a stream of lines into the chunks of a list of the struct, using
+    the same rules as the chunking of a whole text. The '#id'/'#start'
+    regexes are matched line by line, so they are expected to not span
+    several lines.
+
+    ``boundaries`` are the '#id'/'#start' regexes of the lists leading to the
+    one that is split, from the outermost one. Only the chunk being read is
+    kept in memory.
+    """
+
+    def __init__(self, boundaries):
+        self.boundaries = tuple(boundaries)
+        # number of nested lists which have a chunk open, the chunk being
+        # read is the one of the innermost list
+        self._open = 0
+        self._pieces = []
+        self._start = None
+        self._newline = "\n"
+
+    def feed(self, line):
+        """Consumes a line and returns the chunks it completed"""
+        self._newline = "\n" if isinstance(line, six.text_type) else b"\n"
+        completed = []
+        innermost = len(self.boundaries) - 1
+        for position, level in self._events(line):
+            # chunks of an inner list only exist inside a chunk of the outer one
+            if level > self._open:
+                continue
+            if self._open > innermost:
+                completed.append(self._take(line, position))
+            self._open = level + 1
+            if level == innermost:
+                self._pieces = []
+                self._start = position
+
+        if self._open > innermost:
+            if self._start is not None:
+                self._pieces.append(line[self._start :])
+                self._start = None
+            else:
+                self._pieces.append(line)
+        return [chunk for chunk in completed if len(chunk) > 0]
+
+    def close(self, newline=False):
+        """
+        Returns the last chunk, if any, once there are no more lines. With
+        ``newline`` the last line ended with a newline, which the last chunk
+        keeps like the end of a whole text does.
+        """
+        chunk = None
+        if self._open >= len(self.boundaries):
+            chunk = self._newline.join(self._pieces)
+            if newline and len(self._pieces) > 0:
+                chunk += self._newline
+        self._open = 0
+        self._pieces = []
+        return [chunk] if chunk else []
+
+    def _take(self, line, position):
+        if self._start is not None:
+            chunk = line[self._start : position]
+        else:
+            self._pieces.append(line[:position])
+            chunk = self._newline.join(self._pieces)
+        self._pieces = []
+        self._start = None
+        return chunk
+
+    def _events(self, line):
+        events = []
+        for level, boundary in enumerate(self.boundaries):
+            for match in boundary.regex.finditer(line):
+                events.append((match.start(), level))
+        events.sort()
+        return events
+
+
+def list_path(root, key=None):
+    """
+    Returns the struct nodes leading to the list at ``key``, the list being
+    the last one. ``key`` is the dotted path of parsed keys, e.g.
+    'tables.flows', and it can be omitted when the struct has a single list
+    at the top.
+    """
+    if key is None:
+        candidates = [field for field in root.fields if _is_chunked_list(field)]
+        if len(candidates) != 1:
+            raise KeyError(
+                "The key of the list is required, the struct has {} lists at "
+                "the top".format(len(candidates))
+            )
+        return [candidates[0]]
+
+    names = key.split(".") if isinstance(key, six.string_types) else list(key)
+    path = []
+    node = root
+    for name in names:
+        fields = [field for field in node.fields if field.key == name]
+        if len(fields) <= 0 or not _is_struct(fields[-1]):
+            raise KeyError("'{}' is not a dictionary of the struct".format(name))
+        node = fields[-1]
+        path.append(node)
+    if not _is_chunked_list(node):
+        raise KeyError("'{}' is not a list of the struct".format(names[-1]))
+    return path
+
+
+def streamed_levels(root, key=None):
+    """
+    Returns the '#id'/'#start' boundaries of the lists leading to the list at
+    ``key``, see ``list_path``, and the struct node of its items. Every level
+    of the path must be a list without an '#end' key.
+    """
+    boundaries = []
+    for node in list_path(root, key):
+        if not _is_chunked_list(node):
+            raise KeyError("'{}' is not a list of the struct".format(node.key))
+        if node.end is not None:
+            raise ValueError(
+                "'{}' can not be streamed, it has an '{}' key".format(
+                    node.key, KEYWORD_END
+                )
+            )
+        boundaries.append(node.start)
+    return boundaries, node
+
+
+class LineParser(object):
+    """
+    Parses the items of the list at ``key`` from lines pushed one at a time.
+    Lines given as bytes, e.g. read from a file opened in binary mode, are
+    matched with the byte patterns of the plan in ``encoding``.
+    """
+
+    def __init__(self, plan, key=None, encoding=DEFAULT_ENCODING):
+        self.plan = plan
+        self.key = key
+        self.encoding = encoding
+        # fails early if the key is not a list that can be streamed
+        streamed_levels(plan.root, key)
+        self._node = None
+        self._splitter = None
+        self._newline = False
+
+    def feed(self, line):
+        """Consumes a line and returns the items it completed"""
+        if self._splitter is None:
+            plan = self.plan
+            if not isinstance(line, six.string_types):
+                plan = plan.binary(self.encoding)
+            boundaries, self._node = streamed_levels(plan.root, self.key)
+            self._splitter = BlockSplitter(boundaries)
+        self._newline = line[-1:] in ("\n", b"\n")
+        return [
+            self._parse(chunk) for chunk in self._splitter.feed(_strip_newline(line))
+        ]
+
+    def close(self):
+        """Returns the last item, if any, once there are no more lines"""
+        if self._splitter is None:
+            return []
+        return [self._parse(chunk) for chunk in self._splitter.close(self._newline)]
+
+    def _parse(self, chunk):
+        return self._node.evaluate_fields(chunk, 0, len(chunk))
+
+
+def parse_stream(lines, plan, key=None, encoding=DEFAULT_ENCODING):
+    """Yields the parsed items of the list at ``key`` as soon as they are read"""
+    parser = LineParser(plan, key, encoding)
+    return _parse_lines(lines, parser)
+
+
+def _parse_lines(lines, parser):
+    if isinstance(lines, six.string_types):
+        lines = lines.split("\n")
+    for line in lines:
+        for item in parser.feed(line):
+            yield item
+    for item in parser.close():
+        yield item
+
+
+def _is_struct(field):
+    return getattr(field, "fields", None) is not None
+
+
+def _is_chunked_list(field):
+    return (
+        _is_struct(field)
+        and field.is_list
+        and getattr(field, "start", None) is not None
+    )
+
+
+def _strip_newline(line):
+    return line[:-1] if line[-1:] in ("\n", b"\n") else line
@@ -0,0 +1,287 @@
+import collections
+
+import six
+
+from . import plan as _plan
+from .analysis import backtracking_risk
+from .constants import (
+    KEYWORD_ID,
+    KEYWORD_START,
+    KEYWORD_END,
+    KEYWORD_COLUMNAR,
+    KEYWORD_CHAR,
+    MODULE_CHAR,
+    DEFAULT_MODULE_NAME,
+)
+
+ERROR = "error"
+WARNING = "warning"
+
+ROOT_PATH = "<root>"
+
+KEYWORDS = (KEYWORD_ID, KEYWORD_START, KEYWORD_END, KEYWORD_COLUMNAR)
+
+# a problem found in a struct, ``path`` being the one of the key in the parsed
+# output, e.g. 'tables[].flows[].cookie'
+Issue = collections.namedtuple("Issue", ["path", "level", "message"])
+
+
+class Report(object):
+    """
+    The problems found in a struct and the number of regex scans its
+    dictionaries take. ``scans`` maps the path of every dictionary to the
+    number of scans of each of its chunks, the dictionaries without chunks
+    being scanned over the chunk of their parent. It is empty when the
+    struct has errors.
+    """
+
+    def __init__(self):
+        self.issues = []
+        self.scans = collections.OrderedDict()
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue.level == ERROR]
+
+    @property
+    def warnings(self):
+        return [issue for issue in self.issues if issue.level == WARNING]
+
+    @property
+    def valid(self):
+        return len(self.errors) <= 0
+
+    def add(self, path, level, message):
+        self.issues.append(Issue(path, level, message))
+
+    def check(self):
+        """Raises a ``ValueError`` listing the errors of the struct, if any"""
+        errors = self.errors
+        if len(errors) > 0:
+            raise ValueError(
+                "Invalid struct:\n"
+                + "\n".join("{}: {}".format(e.path, e.message) for e in errors)
+            )
+
+    def __str__(self):
+        lines = [
+            "{} {}: {}".format(issue.level, issue.path, issue.message)
+            for issue in self.issues
+        ]
+        lines.extend(
+            "scans {}: {}".format(path, scans) for path, scans in self.scans.items()
+        )
+        return "\n".join(lines)
+
+
+def validate(struct, encoding=None, backend=None):
+    """
+    Checks the whole struct without parsing any text and returns a
+    ``Report`` of all the problems found rather than failing at the first
+    one like ``compile``: unknown keywords, lists without '#id'/'#start',
+    modules that cannot be loaded, values their module rejects, groups the
+    regex does not have and regexes prone to catastrophic backtracking.
+    """
+    report = Report()
+    if not isinstance(struct, dict):
+        report.add(ROOT_PATH, ERROR, "the struct must be a dictionary")
+        return report
+    _check_node(struct, ROOT_PATH, False, report, encoding, backend)
+    if report.valid:
+        root = _plan.compile(struct, encoding, backend).root
+        _count_scans(root, ROOT_PATH, report.scans)
+    return report
+
+
+def _check_node(struct, path, is_list, report, encoding, backend):
+    for k, v in six.iteritems(struct):
+        if not isinstance(k, six.string_types) or len(k) <= 0:
+            report.add(path, WARNING, "the key {!r} is ignored".format(k))
+            continue
+
+        key = k.strip().lower()
+        module_name = None
+        if MODULE_CHAR in key:
+            key, module_name = key.split(MODULE_CHAR, 1)
+        keyword = key if key.startswith(KEYWORD_CHAR) else None
+        if keyword is not None:
+            key = key[1:]
+        key_path = _path(path, key)
+
+        try:
+            module = _plan.load_module(module_name)
+        except ImportError:
+            report.add(
+                key_path, ERROR, "the module '{}' cannot be loaded".format(module_name)
+            )
+            continue
+
+        if keyword is not None and keyword not in KEYWORDS:
+            report.add(
+                key_path,
+                WARNING,
+                "'{}' is not a keyword, it is parsed as the key '{}'".format(
+                    keyword, key
+                ),
+            )
+        if not module_name and keyword is None:
+            nested = v
+            if isinstance(v, (list, tuple)) and len(v) > 0 and isinstance(v[0], dict):
+                if len(v) > 1:
+                    report.add(
+                        key_path,
+                        WARNING,
+                        "only the first dictionary of the list is used",
+                    )
+                nested = v[0]
+            if isinstance(nested, dict):
+                nested_list = nested is not v
+                if "regex" in nested and not nested_list:
+                    report.add(
+                        key_path,
+                        WARNING,
+                        "the dictionary is parsed as a struct, the regex of a key "
+                        "with attributes is given at '{}{}{}'".format(
+                            key, MODULE_CHAR, DEFAULT_MODULE_NAME
+                        ),
+                    )
+                _check_node(
+                    nested,
+                    key_path + ("[]" if nested_list else ""),
+                    nested_list,
+                    report,
+                    encoding,
+                    backend,
+                )
+                continue
+
+        if keyword not in (KEYWORD_START, KEYWORD_END, KEYWORD_COLUMNAR):
+            _check_leaf(key, module, v, key_path, report, encoding, backend)
+
+    _check_boundaries(struct, path, is_list, report, encoding, backend)
+
+
+def _check_leaf(key, module, value, path, report, encoding, backend):
+    compiler = getattr(module, "compile", None)
+    if compiler is None:
+        return
+    options = {}
+    if encoding is not None:
+        options["encoding"] = encoding
+    if backend is not None:
+        options["backend"] = backend
+    try:
+        spec = compiler(key, value, **options)
+    except Exception as e:
+        report.add(path, ERROR, str(e))
+        return
+
+    regex = getattr(spec, "regex", None)
+    if regex is None:
+        return
+    group = _requested_group(value)
+    if group is not None and group > regex.groups:
+        report.add(
+            path,
+            WARNING,
+            "the group {} is asked but the regex has {} groups, the group {} "
+            "is used".format(group, regex.groups, spec.group),
+        )
+    _check_regex(regex, path, report)
+
+
+def _check_boundaries(struct, path, is_list, report, encoding, backend):
+    has_start = KEYWORD_ID in struct or KEYWORD_START in struct
+    if is_list and not has_start:
+        report.add(
+            path,
+            ERROR,
+            "'{}' or '{}' key is required in a list containing a dictionary".format(
+                KEYWORD_ID, KEYWORD_START
+            ),
+        )
+    if KEYWORD_END in struct and not has_start:
+        report.add(
+            path,
+            WARNING,
+            "'{}' is ignored without '{}' or '{}'".format(
+                KEYWORD_END, KEYWORD_ID, KEYWORD_START
+            ),
+        )
+    if KEYWORD_ID in struct and KEYWORD_START in struct:
+        report.add(
+            path,
+            WARNING,
+            "the chunks start at '{}', '{}' is only parsed as the key '{}'".format(
+                KEYWORD_START, KEYWORD_ID, KEYWORD_ID[1:]
+            ),
+        )
+    if struct.get(KEYWORD_COLUMNAR) and not is_list:
+        report.add(
+            path,
+            ERROR,
+            "'{}' is only allowed in a dictionary of a list".format(KEYWORD_COLUMNAR),
+        )
+
+    keywords = []
+    if has_start:
+        keywords.append(KEYWORD_START if KEYWORD_START in struct else KEYWORD_ID)
+        if KEYWORD_END in struct:
+            keywords.append(KEYWORD_END)
+    for keyword in keywords:
+        try:
+            regex = _plan.compile_regex(keyword, struct[keyword], encoding, backend)
+        except Exception as e:
+            report.add(_path(path, keyword), ERROR, str(e))
+            continue
+        _check_regex(regex, _path(path, keyword), report)
+
+
+def _check_regex(regex, path, report):
+    if backtracking_risk(regex):
+        report.add(
+            path,
+            WARNING,
+            "the regex '{}' nests unbounded repeats, it may take exponential "
+            "time to fail on long lines".format(regex.pattern),
+        )
+
+
+def _requested_group(value):
+    if isinstance(value, (list, tuple)) and len(value) > 0:
+        value = value[0]
+    if not isinstance(value, dict) or "group" not in value:
+        return None
+    try:
+        return int(value["group"])
+    except (TypeError, ValueError):
+        return None
+
+
+def _count_scans(node, path, scans):
+    # the scans of the chunk of the node, the ones of the dictionaries without
+    # chunks included as they are scanned over the same span
+    batched = set()
+    count = 0
+    for _, _, _, positions in node.batches:
+        batched.update(positions)
+        count += 1
+    scans[path] = 0
+    for position, field in enumerate(node.fields):
+        if position in batched:
+            continue
+        if getattr(field, "fields", None) is None:
+            count += 1
+            continue
+        field_path = _path(path, field.key) + ("[]" if field.is_list else "")
+        if field.start is None:
+            count += _count_scans(field, field_path, scans)
+        else:
+            count += 1 if field.end is None else 2
+            _count_scans(field, field_path, scans)
+    scans[path] = count
+    return count
+
+
+def _path(parent, key):
+    return key if parent == ROOT_PATH else parent + "." + key
@@ -30,8 +30,10 @@ setup(
     author="Darin Sikanic",
     author_email="darin.sikanic@gmail.com",
     url="https://github.com/tijo-io/pytijo",
-    packages=find_packages(exclude=["tests"]),
+    packages=find_packages(exclude=["tests", "tests.*", "benchmarks", "benchmarks.*"]),
     install_requires=["six"],
+    extras_require={"yaml": ["PyYAML"]},
+    entry_points={"console_scripts": ["pytijo = pytijo.cli:main"]},
     keywords="pytijo tijo structifytext structure text network cli parser",
     classifiers=[
         "Development Status :: 2 - Pre-Alpha",
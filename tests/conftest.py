@@ -0,0 +1,4 @@
+import sys
+
+# the asyncio front-end uses a syntax older pythons can not even compile
+collect_ignore = ["test_parser_aio.py"] if sys.version_info < (3, 7) else []
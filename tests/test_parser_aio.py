@@ -0,0 +1,41 @@
+import os
+import json
+import asyncio
+from concurrent import futures
+from pytijo import parser
+from .test_parser_api import mock_struct, mock_group_struct  # noqa: F401
+
+
+def read(filename):
+    output_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    with open(output_file, "r") as fin:
+        return fin.read()
+
+
+def test_parse_async(mock_struct):
+    expected_output = json.loads(read("./flow_output_parsed.txt"))
+    parsed = asyncio.run(parser.parse_async(read("./flow_output.txt"), mock_struct))
+    assert parsed == expected_output
+
+
+def test_parse_async_process_pool(mock_struct):
+    expected_output = json.loads(read("./flow_output_parsed.txt"))
+    with futures.ProcessPoolExecutor(max_workers=1) as pool:
+        parsed = asyncio.run(
+            parser.parse_async(read("./flow_output.txt"), mock_struct, executor=pool)
+        )
+    assert parsed == expected_output
+
+
+def test_parse_stream_async(mock_group_struct):
+    expected_output = json.loads(read("./group_output_parsed.txt"))
+
+    async def lines():
+        for line in read("./group_output.txt").splitlines(True):
+            yield line
+
+    async def collect():
+        parsed = parser.parse_stream_async(lines(), mock_group_struct)
+        return [group async for group in parsed]
+
+    assert asyncio.run(collect()) == expected_output["groups"]
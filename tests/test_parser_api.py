@@ -1,5 +1,7 @@
+import io
 import os
 import json
+import mmap
 import pytest
 from pytijo import parser
 
@@ -156,3 +158,326 @@ def test_parse(mock_struct):
     expected_output = json.loads(read("./flow_output_parsed.txt"))
     parsed = parser.parse(read("./flow_output.txt"), mock_struct)
     assert parsed == expected_output
+
+
+def test_compile(mock_struct):
+    expected_output = json.loads(read("./flow_output_parsed.txt"))
+    plan = parser.compile(mock_struct)
+    assert isinstance(plan, parser.StructPlan)
+    assert plan.parse(read("./flow_output.txt")) == expected_output
+    assert plan.parse(read("./flow_output.txt").splitlines()) == expected_output
+
+
+def test_compile_is_cached(mock_struct):
+    assert parser.compile(mock_struct) is parser.compile(dict(mock_struct))
+
+
+def test_compile_validates_struct():
+    with pytest.raises(TypeError):
+        parser.compile({"flows": [{"#id": r"\[FLOW_ID(\d+)\]", "info": 10}]})
+
+
+def test_parse_stream(mock_struct):
+    expected_output = json.loads(read("./flow_output_parsed.txt"))
+    output_file = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "flow_output.txt"
+    )
+    with open(output_file, "r") as fin:
+        parsed = list(parser.parse_stream(fin, mock_struct))
+    assert parsed == expected_output["tables"]
+
+
+def test_parse_stream_nested_list(mock_group_struct):
+    expected_output = json.loads(read("./group_output_parsed.txt"))
+    lines = read("./group_output.txt").splitlines()
+    parsed = parser.parse_stream(lines, mock_group_struct, key="groups.bucket")
+    assert list(parsed) == [
+        bucket for group in expected_output["groups"] for bucket in group["bucket"]
+    ]
+
+
+def test_parse_stream_end_of_text():
+    struct = {"items": [{"#id": r"item (\d+)", "end": r"\d(\s*)\Z"}]}
+    for text in ("item 1 x 5\nitem 2 x 7\n", "item 1 x 5\nitem 2 x 7\n\n"):
+        expected = parser.parse(text, struct)["items"]
+        assert expected[-1]["end"] == text[text.rindex("7") + 1 :]
+        assert list(parser.parse_stream(io.StringIO(text), struct)) == expected
+        assert list(parser.parse_stream(text, struct)) == expected
+
+
+def test_parse_stream_unknown_list(mock_struct):
+    with pytest.raises(KeyError):
+        list(parser.parse_stream([], mock_struct, key="groups"))
+
+
+def test_parse_bytes(mock_struct):
+    expected_output = json.loads(read("./flow_output_parsed.txt"))
+    data = read("./flow_output.txt").encode("utf-8")
+    assert parser.parse(data, mock_struct) == expected_output
+    assert parser.parse(memoryview(data), mock_struct) == expected_output
+
+
+def test_parse_bytes_after_struct_change():
+    struct = {"count": r"count (\d)"}
+    assert parser.parse("count 1 total 2", struct) == {"count": "1"}
+    # the cached plan of the struct is not changed along with the struct
+    struct["count"] = r"total (\d)"
+    original = {"count": r"count (\d)"}
+    assert parser.parse(b"count 1 total 2", original) == {"count": "1"}
+    assert parser.parse_multi(b"count 1 total 2", {"a": original}) == {
+        "a": {"count": "1"}
+    }
+
+
+def test_parse_mmap(mock_group_struct):
+    expected_output = json.loads(read("./group_output_parsed.txt"))
+    output_file = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "group_output.txt"
+    )
+    with open(output_file, "rb") as fin:
+        data = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            assert parser.parse(data, mock_group_struct) == expected_output
+        finally:
+            data.close()
+
+
+def test_parse_many(mock_struct):
+    expected_output = json.loads(read("./flow_output_parsed.txt"))
+    texts = [read("./flow_output.txt")] * 3 + [None]
+    parsed = list(parser.parse_many(texts, mock_struct, workers=2, batch_size=2))
+    assert parsed == [expected_output] * 3 + [None]
+
+
+def test_parse_many_unordered_with_errors():
+    texts = ["1", [2], "3"]
+    parsed = dict(
+        parser.parse_many(texts, {"count": r"(\d)"}, executor="thread", ordered=False)
+    )
+    assert parsed[0] == {"count": "1"}
+    assert isinstance(parsed[1], TypeError)
+    assert parsed[2] == {"count": "3"}
+
+
+def test_parse_many_invalid_struct():
+    struct = {"count@tijo_re": {"regex": r"(\d)", "group": "two"}}
+    with pytest.raises(ValueError):
+        parser.parse_many(["1"], struct, executor="thread")
+
+
+def _unpicklable(item, plan):
+    return lambda: item
+
+
+def test_map_batches(mock_struct):
+    from pytijo import parallel
+
+    results = parallel.map_batches(
+        _unpicklable,
+        ["a", "b", "c"],
+        mock_struct,
+        workers=1,
+        batch_size=2,
+        failed=lambda item, e: (item, type(e).__name__),
+    )
+    # the results of the batches cannot be sent back from the worker
+    assert [item for item, error in results] == ["a", "b", "c"]
+
+
+def test_parse_parallel(mock_struct):
+    expected_output = json.loads(read("./flow_output_parsed.txt"))
+    parsed = parser.parse_parallel(
+        read("./flow_output.txt"), mock_struct, workers=2, min_chunks=2, min_size=0
+    )
+    assert parsed == expected_output
+
+
+def test_parse_parallel_backend(mock_struct, monkeypatch):
+    from pytijo import backends, parallel
+
+    backends.register(backends.Backend("chunks", "re"))
+    text = read("./flow_output.txt")
+    parsed = parser.parse_parallel(
+        text, mock_struct, workers=2, min_chunks=2, min_size=0, backend="chunks"
+    )
+    assert parsed == parser.parse(text, mock_struct)
+
+    # the workers compile the struct with the backend of the parent
+    compiled = []
+    compile = parallel._plan.compile
+    monkeypatch.setattr(
+        parallel._plan,
+        "compile",
+        lambda *args: compiled.append(args[2]) or compile(*args),
+    )
+    parallel._parse_chunks(mock_struct, None, "chunks", 0, ["[TABLE 0]"])
+    assert compiled == ["chunks"]
+
+
+def test_profile(mock_struct):
+    from pytijo import instrument
+
+    emitted = []
+    with instrument.profile(sink=emitted.append) as profiler:
+        parsed = parser.parse(read("./flow_output.txt"), mock_struct)
+    assert parsed == json.loads(read("./flow_output_parsed.txt"))
+
+    stats = dict((s.path, s) for s in profiler.stats())
+    assert stats["tables[]"].chunks == 3
+    assert stats["tables[].flows[]"].calls == 37
+    assert stats["tables[].flows[].priority"].matches == 37
+    assert stats["tables[].flows[].instructions.apply_actions.group"].chunks == 28
+    assert sorted(emitted) == sorted(profiler.stats())
+    assert "tables[].flows[].match_fields" in profiler.report()
+
+    # the plans are no longer instrumented once the profile is over
+    parser.parse(read("./flow_output.txt"), mock_struct)
+    assert dict((s.path, s) for s in profiler.stats()) == stats
+
+
+def test_profile_threads(mock_struct):
+    import threading
+    from pytijo import instrument
+
+    text = read("./flow_output.txt")
+    started, done = threading.Event(), threading.Event()
+    profiled = []
+
+    def profile():
+        with instrument.profile() as profiler:
+            started.set()
+            done.wait()
+            parser.parse(text, mock_struct)
+        profiled.append(profiler)
+
+    thread = threading.Thread(target=profile)
+    thread.start()
+    started.wait()
+    # the parses of other threads are not profiled
+    parser.parse(text, mock_struct)
+    done.set()
+    thread.join()
+    stats = dict((s.path, s) for s in profiled[0].stats())
+    assert stats["tables[].flows[]"].calls == 37
+
+
+def test_parse_lazy(mock_struct):
+    from pytijo import instrument
+
+    expected_output = json.loads(read("./flow_output_parsed.txt"))
+    with instrument.profile() as profiler:
+        parsed = parser.parse(read("./flow_output.txt"), mock_struct, lazy=True)
+        flow = parsed["tables"][1]["flows"][0]
+        assert flow["priority"] == expected_output["tables"][1]["flows"][0]["priority"]
+
+    # only the keys that were accessed are parsed
+    stats = dict((s.path, s) for s in profiler.stats())
+    assert stats["tables[].flows[].priority"].calls == 1
+    assert "tables[].flows[].cookie" not in stats
+
+    assert len(parsed["tables"]) == len(expected_output["tables"])
+    assert parsed == expected_output
+    assert parsed.materialize() == expected_output
+    assert json.dumps(parsed.materialize())
+
+
+def test_incremental_parser(mock_struct):
+    from pytijo.incremental import IncrementalParser, CHANGED, REMOVED
+
+    text = read("./flow_output.txt")
+    incremental = IncrementalParser(mock_struct)
+    assert incremental.parse(text) == json.loads(read("./flow_output_parsed.txt"))
+
+    changed = text.replace("Priority         = 1001", "Priority         = 7", 1)
+    result, changes = incremental.parse(changed, diff=True)
+    assert result == parser.parse(changed, mock_struct)
+    # the table holding the flow and the flow itself are parsed again, the
+    # other two tables and flows of the table are reused
+    assert (incremental.parsed, incremental.reused) == (2, 4)
+    assert [(c.kind, c.path) for c in changes] == [
+        (CHANGED, ("tables", "0", "flows", "2"))
+    ]
+    assert changes[0].new["priority"] == "7"
+
+    start = changed.index("    [FLOW_ID1]")
+    removed = changed[:start] + changed[changed.index("    [FLOW_ID2]") :]
+    result, changes = incremental.parse(removed, diff=True)
+    assert result == parser.parse(removed, mock_struct)
+    assert [(c.kind, c.path) for c in changes] == [
+        (REMOVED, ("tables", "0", "flows", "1"))
+    ]
+
+    # the flows of the tables reused as a whole are kept, an unchanged poll
+    # followed by a change only parses the changed flow and its table
+    assert incremental.parse(removed) == result
+    assert (incremental.parsed, incremental.reused) == (0, 3)
+    changed = removed.replace("Priority         = 30311", "Priority         = 7", 1)
+    assert incremental.parse(changed) == parser.parse(changed, mock_struct)
+    assert (incremental.parsed, incremental.reused) == (2, 32)
+
+
+def test_parse_multi(mock_struct, mock_group_struct):
+    text = read("./flow_output.txt")
+    priorities = {
+        "tables": [
+            {
+                "#id": r"\[TABLE (\d{1,2})\]",
+                "flows": [
+                    {"#id": r"\[FLOW_ID(\d+)\]", "priority": r"Priority\s+=\s+(\d+)"}
+                ],
+            }
+        ],
+        "version": r"ofp_version\s+=\s+(\d+)",
+    }
+    structs = {
+        "flows": mock_struct,
+        "priorities": priorities,
+        "groups": mock_group_struct,
+    }
+    parsed = parser.parse_multi(text, structs)
+    assert parsed == dict(
+        (name, parser.parse(text, struct)) for name, struct in structs.items()
+    )
+    assert parsed["flows"] == json.loads(read("./flow_output_parsed.txt"))
+    assert parser.parse_multi(text.encode("utf-8"), structs) == parsed
+    assert parser.parse_multi(None, structs) == dict.fromkeys(structs)
+
+
+def test_cli(mock_group_struct, tmp_path, capsys):
+    from pytijo import cli
+
+    struct = tmp_path / "struct.json"
+    struct.write_text(json.dumps(mock_group_struct))
+    text = read("./group_output.txt")
+    for name in ("a", "b", "c"):
+        (tmp_path / "{}.txt".format(name)).write_text(text)
+    (tmp_path / "empty.txt").write_text("")
+    output = tmp_path / "out.ndjson"
+
+    files = [str(struct), str(tmp_path / "*.txt")]
+    missing = str(tmp_path / "missing.txt")
+    options = ["-o", str(output), "--executor", "thread", "--ordered"]
+    assert cli.main(files + [missing] + options) == 1
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    expected = parser.parse(text, mock_group_struct)
+    assert [os.path.basename(r["path"]) for r in records] == [
+        "a.txt",
+        "b.txt",
+        "c.txt",
+        "empty.txt",
+        "missing.txt",
+    ]
+    empty = parser.parse("", mock_group_struct)
+    assert [r.get("result") for r in records[:4]] == [expected] * 3 + [empty]
+    assert "error" in records[4]
+    report = capsys.readouterr().err
+    assert "files: 5 (1 errors)" in report
+    assert "throughput" in report
+
+    assert cli.main(files + ["-o", str(output), "--workers", "2", "-q"]) == 0
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(os.path.basename(r["path"]) for r in records)[:3] == [
+        "a.txt",
+        "b.txt",
+        "c.txt",
+    ]
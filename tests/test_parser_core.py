@@ -1,6 +1,11 @@
+import io
 import re
+import json
+import datetime
+import ipaddress
 import pytest
-from pytijo import parser
+from pytijo import cache, parser, registry
+from pytijo.modules import tijo_re
 
 
 @pytest.fixture(scope="module")
@@ -188,3 +193,496 @@ def test_parse_returns_none():
     assert parsed_list == {"count": None}
     parsed_dict = parser._parse_dict({"id": [{"#id": r"(elephant)"}]}, lines)
     assert parsed_dict == {"id": None}
+
+
+def test_parse_dict_single_pass():
+    text = "packets: 10 Bytes: 20\nbytes: 30 packets: 40\nerrors: none"
+    struct = {
+        "bytes": r"[Bb]ytes:\s(\d+)",
+        "packets": r"[Pp]ackets:\s(\d+)",
+        "line": r"[bp]\w+:\s(.+)",
+        "errors": r"[Ee]rrors:\s(\d+)",
+    }
+    plan = parser.compile(struct)
+    assert len(plan.root.batches) == 1
+    parsed = parser._parse_dict(struct, text)
+    expected_output = {
+        "bytes": "20",
+        "packets": "10",
+        "line": "10 Bytes: 20",
+        "errors": None,
+    }
+    assert parsed == expected_output
+
+
+def test_chunk_spans(mock_chunky_data):
+    struct = {"#id": r"(Chunk\sStart)"}
+    spans = parser._chunk_spans(mock_chunky_data, struct)
+    assert spans == [(18, 105), (105, len(mock_chunky_data))]
+    assert parser._chunk_spans(mock_chunky_data, struct, 19) == [
+        (105, len(mock_chunky_data))
+    ]
+
+
+def test_chunk_spans_anchored_regex(mock_chunky_data):
+    # '^' matches at the start of a chunk as if the chunk was a text by itself
+    struct = {"#id": r"^(Chunk\sStart)"}
+    assert parser._chunk_spans(mock_chunky_data, struct) is None
+    assert parser._chunk_spans(mock_chunky_data, struct, 18) == [
+        (18, len(mock_chunky_data))
+    ]
+
+
+def test_lru_cache_counters():
+    lru = cache.LRUCache(2)
+    assert lru.get("a", lambda: 1) == 1
+    assert lru.get("a", lambda: 2) == 1
+    lru.get("b", lambda: 3)
+    lru.get("c", lambda: 4)
+    assert lru.get(["unhashable"], lambda: 5) == 5
+    assert lru.info() == cache.CacheInfo(1, 3, 1, 2, 2)
+    lru.resize(1)
+    assert lru.info().evictions == 2
+    assert lru.get("c", lambda: 6) == 4
+
+
+def test_cache_info():
+    cache.clear()
+    parser.compile({"somekey": r"value\sis:\s(\d+)"})
+    parser.compile({"somekey": r"value\sis:\s(\d+)"})
+    info = cache.info()
+    assert info["plans"].hits == 1
+    assert info["plans"].misses == 1
+    assert info["patterns"].currsize >= 1
+
+
+def test_regex_backend_fallback():
+    import re
+    from pytijo import backends
+
+    # an engine without multiline support, the boundaries fall back to re
+    backends.register(backends.Backend("strict", "re", flags=re.IGNORECASE))
+    struct = {"items": [{"#id": r"^item (\d+)", "value": r"value (\w+)"}]}
+    text = "item 1\nvalue a\nitem 2\nvalue b"
+    plan = parser.compile(struct, backend="strict")
+    assert plan.backend == "strict"
+    assert plan.parse(text) == parser.parse(text, struct)
+    assert plan is not parser.compile(struct)
+
+    with pytest.raises(ValueError):
+        parser.compile(struct, backend="unknown")
+
+
+def test_parse_timeout():
+    struct = {"items": [{"#id": r"item (\d+)", "value": r"value (\w+)"}]}
+    with pytest.raises(parser.ParseTimeout):
+        parser.parse("item 1\nvalue a", struct, timeout=-1)
+    assert parser.parse("item 1\nvalue a", struct, timeout=60) == {
+        "items": [{"id": "1", "value": "a"}]
+    }
+    with pytest.raises(ValueError):
+        parser.parse("item 1\nvalue a", struct, timeout=60, lazy=True)
+
+
+def test_extract_indexed(monkeypatch):
+    from pytijo.index import TextIndex
+
+    monkeypatch.setattr(tijo_re, "INDEX_MIN_SPAN", 0)
+    text = "aaab aab x=1 x=22 x=333"
+    index = TextIndex(text)
+    for key, value in [
+        ("overlapping", r"aab"),
+        ("values", [r"x=(\d+)"]),
+        ("first", r"(x=\d\d)"),
+        ("missing", r"y=(\d+)"),
+    ]:
+        spec = tijo_re.compile(key, value)
+        for pos, endpos in [(0, None), (1, 12), (13, 20)]:
+            assert tijo_re.extract_indexed(
+                text, spec, index, pos, endpos
+            ) == tijo_re.extract(text, spec, pos, endpos)
+    assert index.offsets("aab") == [1, 5]
+    assert index.offsets("aa") == [0, 1, 5]
+
+
+def test_required_literal():
+    from pytijo.analysis import required_literal
+
+    assert required_literal(re.compile(r"(\d+)\s+Cookie")) == "Cookie"
+    assert required_literal(re.compile(r"(\[MATCHFIELDS\])")) == "[MATCHFIELDS]"
+    assert required_literal(re.compile(r"x(?:ab)*yz")) == "yz"
+    assert required_literal(re.compile(b"ab\\d")) == b"ab"
+    assert required_literal(re.compile(r"(?i)cookie")) is None
+    assert required_literal(re.compile(r"foo|bar")) is None
+
+    struct = {
+        "count": r"(\d+)\s+packets",
+        "mpls": {"#start": r"(\[POP_MPLS\])", "eth": r"eth\s+=\s+(\w+)"},
+    }
+    assert parser.parse("eth = 1\n12 bytes", struct) == {"count": None, "mpls": None}
+
+    # the profiler counts no scan for the spans skipped
+    from pytijo import instrument
+
+    with instrument.profile() as profiler:
+        parser.parse("eth = 1\n12 bytes", struct)
+    stats = dict((s.path, s) for s in profiler.stats())
+    assert (stats["count"].calls, stats["count"].scans) == (1, 0)
+    assert (stats["mpls"].scans, stats["mpls"].scanned) == (0, 0)
+
+    text = "x=1 " * 2000
+    with instrument.profile() as profiler:
+        parser.parse(text, {"x": r"x=(\d+)"}, index=True)
+    stats = dict((s.path, s) for s in profiler.stats())
+    assert (stats["x"].calls, stats["x"].scans, stats["x"].matches) == (1, 0, 1)
+
+
+def test_typed_values():
+    struct = {
+        "count@tijo_re": {"regex": r"count = (\d+)", "type": "int"},
+        "cookie@tijo_re": {"regex": r"cookie = (\w+)", "type": "hex"},
+        "enabled@tijo_re": {"regex": r"enabled = (\w+)", "type": "bool"},
+        "address@tijo_re": {"regex": r"ip (\S+)", "type": "ip"},
+        "since@tijo_re": {
+            "regex": r"since (.+)",
+            "type": "timestamp",
+            "format": "%d/%m/%Y %H:%M",
+        },
+        "rates@tijo_re": [{"regex": r"rate=(\S+)", "type": "float"}],
+        "broken@tijo_re": {"regex": r"broken = (\S+)", "type": "int"},
+    }
+    text = (
+        "count = 12\ncookie = 0x1f\nenabled = yes\nip 10.0.0.1\n"
+        "since 02/01/2024 03:04\nrate=1.5 rate=2\nbroken = n/a"
+    )
+    parsed = parser.parse(text, struct)
+    assert parsed["count"] == 12
+    assert parsed["cookie"] == 31
+    assert parsed["enabled"] is True
+    assert str(parsed["address"]) == "10.0.0.1"
+    assert parsed["since"].day == 2 and parsed["since"].minute == 4
+    assert parsed["rates"] == [1.5, 2.0]
+    assert parsed["broken"] is None
+    assert parser.parse(text.encode("utf-8"), struct) == parsed
+
+    with pytest.raises(ValueError):
+        parser.compile({"count@tijo_re": {"regex": r"(\d+)", "type": "decimal"}})
+
+
+def test_columnar_list():
+    import array
+
+    struct = {
+        "flows": [
+            {
+                "#id": r"flow (\d+)",
+                "#columnar": True,
+                "packets@tijo_re": {"regex": r"packets=(\d+)", "type": "int"},
+                "bytes@tijo_re": {"regex": r"bytes=(\d+)", "type": "int"},
+                "name": r"name=(\w+)",
+            }
+        ]
+    }
+    text = "flow 1 packets=10 bytes=100 name=a\nflow 2 packets=20 name=b"
+    flows = parser.parse(text, struct)["flows"]
+    assert flows.length == 2
+    assert flows["packets"] == array.array("q", [10, 20])
+    assert flows["bytes"] == [100, None]
+    assert flows["name"] == ["a", "b"]
+    assert flows.rows() == [
+        {"id": "1", "packets": 10, "bytes": 100, "name": "a"},
+        {"id": "2", "packets": 20, "bytes": None, "name": "b"},
+    ]
+
+    with pytest.raises(ValueError):
+        parser.compile({"flow": {"#columnar": True, "name": r"name=(\w+)"}})
+
+
+COLUMNAR_STRUCT = {
+    "tables": [
+        {
+            "#id": r"table=(\d+)",
+            "flows": [
+                {
+                    "#id": r"flow (\d+)",
+                    "packets@tijo_re": {"regex": r"packets=(\d+)", "type": "int"},
+                }
+            ],
+        }
+    ]
+}
+COLUMNAR_TEXT = "table=0\nflow 1 packets=10\nflow 2 packets=20\ntable=1\nflow 3 packets=30"
+
+
+def test_columnar_output():
+    struct, text = COLUMNAR_STRUCT, COLUMNAR_TEXT
+    tables = parser.parse(text, struct, output="columnar")["tables"]
+    flows = tables["flows"]
+    assert tables["id"] == ["0", "1"]
+    # the columns of numbers are arrays, or NumPy arrays when it is installed
+    assert list(flows.offsets) == [0, 2, 3]
+    assert list(flows["packets"]) == [10, 20, 30]
+    assert tables.rows() == parser.parse(text, struct)["tables"]
+
+    with pytest.raises(ValueError):
+        parser.parse(text, struct, output="rows")
+    with pytest.raises(ValueError):
+        parser.parse(text, struct, output="columnar", lazy=True)
+
+
+def test_columnar_output_numpy():
+    numpy = pytest.importorskip("numpy")
+    text = COLUMNAR_TEXT
+    tables = parser.parse(text, COLUMNAR_STRUCT, output="columnar")["tables"]
+    flows = tables["flows"]
+    assert isinstance(flows.offsets, numpy.ndarray)
+    assert isinstance(flows["packets"], numpy.ndarray)
+    assert flows.offsets.dtype == numpy.int64
+    assert flows["packets"].dtype == numpy.int64
+    assert flows["packets"].tolist() == [10, 20, 30]
+    # the numpy scalars are turned back into the values of a plain parse
+    rows = tables.rows()
+    assert rows == parser.parse(text, COLUMNAR_STRUCT)["tables"]
+    assert type(rows[0]["flows"][0]["packets"]) is int
+
+
+def test_parse_to():
+    struct = {
+        "tables": [
+            {
+                "#id": r"table=(\d+)",
+                "flows": [{"#id": r"flow (\d+)", "packets": r"packets=(\d+)"}],
+            }
+        ]
+    }
+    text = "table=0\nflow 1 packets=10\nflow 2 packets=20\ntable=1\nflow 3 packets=30"
+    fout = io.StringIO()
+    parser.parse_to(fout, text, struct)
+    assert fout.getvalue() == json.dumps(parser.parse(text, struct))
+
+    fout = io.StringIO()
+    assert parser.parse_to(fout, text, struct, format="ndjson", key="tables.flows") == 3
+    records = [json.loads(line) for line in fout.getvalue().splitlines()]
+    assert records == [
+        {"id": "1", "packets": "10"},
+        {"id": "2", "packets": "20"},
+        {"id": "3", "packets": "30"},
+    ]
+
+    with pytest.raises(KeyError):
+        parser.parse_to(io.StringIO(), text, struct, format="ndjson", key="flows")
+    with pytest.raises(ValueError):
+        parser.parse_to(io.StringIO(), text, struct, format="xml")
+
+
+def test_validate():
+    struct = {
+        "flows": [
+            {
+                "#id": r"flow (\d+)",
+                "#foo": r"foo=(\w+)",
+                "name@tijo_re": {"regex": r"name=(\w+)", "group": 2},
+                "path": r"path=((?:/\w+)+)",
+                "words": r"words=((\w+\s?)+)$",
+                "counters": {"#start": r"counters", "packets": r"packets=(\d+)"},
+            }
+        ]
+    }
+    report = parser.validate(struct)
+    assert report.valid
+    assert [(issue.path, issue.level) for issue in report.warnings] == [
+        ("flows[].foo", "warning"),
+        ("flows[].name", "warning"),
+        ("flows[].words", "warning"),
+    ]
+    assert report.scans == {"<root>": 1, "flows[]": 6, "flows[].counters": 1}
+    report.check()
+
+    report = parser.validate(
+        {"flows": [{"name": r"name=(\w+)", "bytes": 3, "id@nomodule": r"(\d+)"}]}
+    )
+    assert [issue.path for issue in report.errors] == [
+        "flows[].bytes",
+        "flows[].id",
+        "flows[]",
+    ]
+    assert report.scans == {}
+    with pytest.raises(ValueError):
+        report.check()
+
+
+class _UpperModule(object):
+    # a module extracting the first word after the key, upper cased, from
+    # the span of the text it is given
+    @staticmethod
+    def compile(key, value, encoding=None, backend=None):
+        return re.compile(re.escape(value) + r"\s+(\w+)")
+
+    @staticmethod
+    def extract(text, spec, pos=0, endpos=None):
+        match = spec.search(text, pos, len(text) if endpos is None else endpos)
+        return match.group(1).upper() if match else None
+
+
+def test_registry():
+    registry.register("upper", _UpperModule)
+    try:
+        struct = {"items": [{"#id": r"item (\d+)", "name@upper": "name"}]}
+        text = "item 1 name foo\nitem 2 name bar"
+        assert parser.parse(text, struct) == {
+            "items": [{"id": "1", "name": "FOO"}, {"id": "2", "name": "BAR"}]
+        }
+        assert "upper" in registry.available()
+        assert "tijo_re" in registry.preload()
+        registry.register(" Shout ", _UpperModule)
+        assert parser.parse(text, {"name@shout": "name"}) == {"name": "FOO"}
+        assert registry.get("SHOUT") is _UpperModule
+    finally:
+        registry.clear()
+
+    with pytest.raises(ImportError):
+        registry.get("upper")
+    with pytest.raises(TypeError):
+        registry.register("broken", object())
+
+
+def test_table_module():
+    import array
+
+    text = "\n".join(
+        [
+            "Kernel IP routing table",
+            "Destination     Gateway         Flags Metric Iface",
+            "--------------- --------------- ----- ------ -----",
+            "0.0.0.0         192.168.1.1     UG         0 eth0",
+            "10.0.0.0        10.0.0.1        UG    100000 tun0",
+            "192.168.1.0                     U          0",
+            "",
+            "Destination     Gateway         Flags Metric Iface",
+            "172.16.0.0      172.16.0.1      UG         5 eth1",
+        ]
+    )
+    columns = ["Destination", "Gateway", "Flags", "Metric", "Iface"]
+    routes = parser.parse(text, {"routes@table": columns})["routes"]
+    assert routes == [
+        {
+            "destination": "0.0.0.0",
+            "gateway": "192.168.1.1",
+            "flags": "UG",
+            "metric": "0",
+            "iface": "eth0",
+        },
+        {
+            "destination": "10.0.0.0",
+            "gateway": "10.0.0.1",
+            "flags": "UG",
+            "metric": "100000",
+            "iface": "tun0",
+        },
+        {
+            "destination": "192.168.1.0",
+            "gateway": None,
+            "flags": "U",
+            "metric": "0",
+            "iface": None,
+        },
+    ]
+
+    struct = {
+        "routes@table": {
+            "columns": {
+                "dst": "Destination",
+                "gw": "Gateway",
+                "flags": "Flags",
+                "metric": "Metric",
+                "iface": "Iface",
+            },
+            "types": {"metric": "int"},
+            "columnar": True,
+        }
+    }
+    routes = parser.parse(text.encode("utf-8"), struct)["routes"]
+    assert routes.length == 3
+    assert routes["dst"] == ["0.0.0.0", "10.0.0.0", "192.168.1.0"]
+    assert routes["metric"] == array.array("q", [0, 100000, 0])
+
+    assert parser.parse("no table", {"routes@table": columns}) == {"routes": None}
+    with pytest.raises(TypeError):
+        parser.compile({"routes@table": "Destination"})
+
+
+def test_result_cache(tmp_path):
+    def assert_typed(parsed):
+        assert isinstance(parsed["at"], datetime.datetime)
+        assert isinstance(parsed["ip"], ipaddress.IPv4Address)
+        assert isinstance(parsed["count"], int)
+
+    struct = {"flows": [{"#id": r"flow (\d+)", "packets": r"packets=(\d+)"}]}
+    text = "flow 1 packets=10\nflow 2 packets=20"
+    path = str(tmp_path / "results.db")
+
+    results = cache.ResultCache(path=path)
+    parsed = parser.parse(text, struct, cache=results)
+    assert parsed == parser.parse(text, struct)
+    assert parser.parse(text.split("\n"), struct, cache=results) is parsed
+    assert parser.parse(text, struct, encoding="latin-1", cache=results) == parsed
+    assert results.info()["memory"].hits == 1
+    results.close()
+
+    # a new cache finds the results in the database
+    results = cache.ResultCache(path=path)
+    assert parser.parse(text, struct, cache=results) == parsed
+    assert results.info()["disk"].hits == 1
+    results.close()
+
+    # the typed values are read back from the database as such
+    typed = {
+        "at@tijo_re": {"regex": r"at (\S+)", "type": "timestamp"},
+        "ip@tijo_re": {"regex": r"from (\S+)", "type": "ip"},
+        "count@tijo_re": {"regex": r"count (\d+)", "type": "int"},
+    }
+    text = "at 2017-03-22T00:58:03 from 10.0.0.1 count 3"
+    results = cache.ResultCache(path=path)
+    parsed = parser.parse(text, typed, cache=results)
+    assert_typed(parsed)
+    results.close()
+    results = cache.ResultCache(path=path)
+    warm = parser.parse(text, typed, cache=results)
+    assert warm == parsed
+    assert_typed(warm)
+    assert results.info()["disk"].hits == 1
+    results.close()
+
+    store = cache.DiskStore(str(tmp_path / "small.db"), max_bytes=200)
+    store.set("a", "x" * 80)
+    store.set("b", "y" * 80)
+    store.set("c", "z" * 80)
+    assert store.get("a") is None
+    assert store.get("c") == "z" * 80
+    assert store.info().evictions == 1
+    store.close()
+
+
+def test_result_cache_locked(tmp_path):
+    import sqlite3
+
+    struct = {"flows": [{"#id": r"flow (\d+)", "packets": r"packets=(\d+)"}]}
+    text = "flow 1 packets=10\nflow 2 packets=20"
+    path = str(tmp_path / "results.db")
+    results = cache.ResultCache(path=path, timeout=0.01)
+    parser.parse(text, struct, cache=results)
+
+    # another process holding the lock of the database for good
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        results.memory.clear()
+        assert parser.parse(text, struct, cache=results) == parser.parse(text, struct)
+        other_text = "flow 3 packets=30"
+        assert parser.parse(other_text, struct, cache=results) == parser.parse(
+            other_text, struct
+        )
+    finally:
+        other.rollback()
+        other.close()
+    results.close()